@@ -0,0 +1,106 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import AsyncIterator
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after_seconds: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_seconds = retry_after_seconds
+
+
+class AdmissionTicket:
+    """A held in-flight slot; release() is idempotent."""
+
+    def __init__(self, controller: "AdmissionController", wait_seconds: float) -> None:
+        self._controller = controller
+        self.wait_seconds = wait_seconds
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release()
+
+    async def guard(self, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Yield from `stream`, releasing the slot once it ends or is closed."""
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            self.release()
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+class AdmissionController:
+    """Per-replica cap on in-flight generations with a bounded FIFO wait queue.
+
+    Requests beyond `max_in_flight` wait in the queue; once the queue holds
+    `max_queue` waiters, or a waiter exceeds `queue_timeout_seconds`, requests
+    are rejected immediately so clients can back off and retry elsewhere.
+    `max_in_flight <= 0` disables admission control.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout_seconds: float,
+        retry_after_seconds: float,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout_seconds
+        self.retry_after = retry_after_seconds
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def reject(self, reason: str) -> AdmissionRejected:
+        return AdmissionRejected(reason, self.retry_after)
+
+    async def acquire(self) -> AdmissionTicket:
+        if self.max_in_flight <= 0 or (
+            self.in_flight < self.max_in_flight and not self._waiters
+        ):
+            self.in_flight += 1
+            return AdmissionTicket(self, 0.0)
+        if len(self._waiters) >= self.max_queue:
+            raise self.reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we gave up; pass it on.
+                self._release()
+            else:
+                waiter.cancel()
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self.reject("queue_timeout") from None
+            raise
+        return AdmissionTicket(self, time.perf_counter() - start)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the oldest live waiter so in_flight never
+        # dips below the cap while requests are queued.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "expires_at", "hits")
+
+    def __init__(self, value: dict[str, Any], size: int, expires_at: float) -> None:
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.hits = 0
+
+
+class AnswerCache:
+    """Bounded answer cache with TTL, byte budget and LRU or LFU eviction."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        policy: str = "lru",
+    ) -> None:
+        if policy not in {"lru", "lfu"}:
+            raise ValueError(f"Unsupported answer cache policy: {policy}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.policy = policy
+        self.bytes = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        query: str,
+        document_ids: list[str],
+        history: list[dict[str, str]],
+        params: dict[str, Any],
+    ) -> str:
+        material = json.dumps(
+            {
+                "query": normalize_query(query),
+                "documents": document_ids,
+                "history": history,
+                "params": params,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    @staticmethod
+    def _sizeof(value: dict[str, Any]) -> int:
+        return sys.getsizeof(json.dumps(value, ensure_ascii=False))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            entry.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def put(self, key: str, value: dict[str, Any]) -> int:
+        """Insert an entry and return how many entries were evicted for it."""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and (
+                len(self._entries) >= self.max_entries or self.bytes + size > self.max_bytes
+            ):
+                self._remove(self._victim())
+                evicted += 1
+            self._entries[key] = CacheEntry(value, size, time.monotonic() + self.ttl_seconds)
+            self.bytes += size
+        return evicted
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+        return count
+
+    def _victim(self) -> str:
+        now = time.monotonic()
+        for key, entry in self._entries.items():
+            if entry.expires_at <= now:
+                return key
+        if self.policy == "lfu":
+            # Ties go to the least recently used entry (OrderedDict order).
+            return min(self._entries, key=lambda key: self._entries[key].hits)
+        return next(iter(self._entries))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
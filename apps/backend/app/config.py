@@ -0,0 +1,107 @@
+import os
+from typing import Any
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in {"1", "true", "yes", "on"}
+
+
+def deployment_options(
+    prefix: str,
+    target_ongoing_requests: float = 2.0,
+    max_ongoing_requests: int | None = None,
+) -> dict[str, Any]:
+    """Serve options for one deployment from `{prefix}_*` environment variables.
+
+    `{prefix}_MAX_REPLICAS` switches the deployment to autoscaling between
+    `{prefix}_MIN_REPLICAS` and it; otherwise `{prefix}_NUM_REPLICAS` is a
+    fixed count. The keyword arguments are the defaults used when the
+    matching variables are unset; other unset variables keep the decorator
+    defaults.
+    """
+    options: dict[str, Any] = {}
+    num_cpus = os.getenv(f"{prefix}_NUM_CPUS")
+    if num_cpus:
+        options["ray_actor_options"] = {"num_cpus": float(num_cpus)}
+    max_ongoing = os.getenv(f"{prefix}_MAX_ONGOING_REQUESTS")
+    if max_ongoing:
+        options["max_concurrent_queries"] = int(max_ongoing)
+    elif max_ongoing_requests:
+        options["max_concurrent_queries"] = max_ongoing_requests
+    max_replicas = os.getenv(f"{prefix}_MAX_REPLICAS")
+    if max_replicas:
+        autoscaling: dict[str, Any] = {
+            "min_replicas": int(os.getenv(f"{prefix}_MIN_REPLICAS", "1")),
+            "max_replicas": int(max_replicas),
+            "target_num_ongoing_requests_per_replica": float(
+                os.getenv(f"{prefix}_TARGET_ONGOING_REQUESTS", str(target_ongoing_requests))
+            ),
+        }
+        for name, key in (
+            ("UPSCALE_DELAY_SECONDS", "upscale_delay_s"),
+            ("DOWNSCALE_DELAY_SECONDS", "downscale_delay_s"),
+        ):
+            value = os.getenv(f"{prefix}_{name}")
+            if value:
+                autoscaling[key] = float(value)
+        options["autoscaling_config"] = autoscaling
+    elif os.getenv(f"{prefix}_NUM_REPLICAS"):
+        options["num_replicas"] = int(os.getenv(f"{prefix}_NUM_REPLICAS", "1"))
+    return options
+
+
+def ingress_scaling_defaults() -> dict[str, Any]:
+    """Autoscaling defaults for RagApp derived from its admission settings.
+
+    Serve counts a request as ongoing until its response body finishes, so
+    an SSE stream holds its replica for the whole generation and requests
+    waiting for admission count too. Targeting a fraction of
+    RAG_MAX_IN_FLIGHT adds replicas while new streams still start
+    immediately, before queue wait shows up in TTFT. max_concurrent_queries
+    covers the in-flight cap plus the admission queue so requests queue
+    where they are measured rather than in the Serve proxy.
+    """
+    max_in_flight = int(os.getenv("RAG_MAX_IN_FLIGHT", "0"))
+    if max_in_flight <= 0:
+        return {}
+    utilization = float(os.getenv("RAG_INGRESS_TARGET_UTILIZATION", "0.7"))
+    return {
+        "target_ongoing_requests": max(1.0, max_in_flight * utilization),
+        "max_ongoing_requests": max_in_flight + int(os.getenv("RAG_ADMISSION_QUEUE_SIZE", "64")),
+    }
+
+
+def cgroup_cpu_quota() -> float | None:
+    """CPU limit of the container (cgroup v2 or v1), or None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as handle:
+            quota, period = handle.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    for base in ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"):
+        try:
+            with open(f"{base}/cpu.cfs_quota_us") as handle:
+                quota_us = int(handle.read())
+            with open(f"{base}/cpu.cfs_period_us") as handle:
+                period_us = int(handle.read())
+        except (OSError, ValueError):
+            continue
+        return quota_us / period_us if quota_us > 0 and period_us > 0 else None
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs this process can actually use: its affinity, capped by the cgroup quota.
+
+    os.cpu_count() reports the host's cores, which oversizes worker pools in
+    a CPU-limited container.
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, int(quota))
+    return max(1, count)
@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import logging
+import random
+import zlib
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import XMLPullParser
+
+import httpx
+
+logger = logging.getLogger("rag-app")
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CrawlResult:
+    """Outcome of fetching one URL.
+
+    `text` is set for a fetched page, `error` for a failure, and neither when
+    the server answered a conditional request with 304 (`not_modified`).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        text: str | None = None,
+        content_type: str = "",
+        error: str | None = None,
+        not_modified: bool = False,
+        validators: dict[str, Any] | None = None,
+    ) -> None:
+        self.url = url
+        self.text = text
+        self.content_type = content_type
+        self.error = error
+        self.not_modified = not_modified
+        # ETag, Last-Modified, body hash and size, for the next conditional fetch.
+        self.validators = validators or {}
+
+
+def response_validators(response: httpx.Response) -> dict[str, Any]:
+    validators: dict[str, Any] = {
+        "content_hash": hashlib.sha256(response.content).hexdigest(),
+        "bytes": len(response.content),
+    }
+    if response.headers.get("etag"):
+        validators["etag"] = response.headers["etag"]
+    if response.headers.get("last-modified"):
+        validators["last_modified"] = response.headers["last-modified"]
+    return validators
+
+
+def conditional_headers(validators: dict[str, Any] | None) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+class Crawler:
+    """Async fetcher for ingest URLs and sitemaps.
+
+    All requests share one connection pool. Concurrency is capped globally
+    and per host so a large sitemap does not hammer a single site.
+    Connection errors, 429 and 5xx gateway responses are retried with
+    exponential backoff and jitter, honouring a numeric Retry-After.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        per_host: int = 4,
+        timeout_seconds: float = 10.0,
+        retries: int = 3,
+        backoff_seconds: float = 0.5,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout_seconds
+        self.retries = max(0, retries)
+        self.backoff = backoff_seconds
+        self.transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._global: asyncio.Semaphore | None = None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the replica's running event loop.
+        if self._client is None or self._client.is_closed:
+            # One extra connection so a sitemap fetch does not queue behind
+            # the page fetches already in flight.
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency + 1,
+                    max_keepalive_connections=self.max_concurrency + 1,
+                ),
+                follow_redirects=True,
+                transport=self.transport,
+            )
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    def _retry_delay(self, attempt: int, response: httpx.Response | None) -> float:
+        retry_after = response.headers.get("retry-after", "") if response is not None else ""
+        if retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        delay = self.backoff * (2**attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    async def fetch(self, url: str, validators: dict[str, Any] | None = None) -> CrawlResult:
+        """Fetch `url`, conditionally when validators from a previous fetch are given."""
+        headers = conditional_headers(validators)
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+        attempt = 0
+        while True:
+            response: httpx.Response | None = None
+            error: str
+            async with self._global, self._host_slot(url):
+                try:
+                    response = await self.client.get(url, headers=headers)
+                    if response.status_code == 304 and headers:
+                        return CrawlResult(url, not_modified=True)
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return CrawlResult(
+                            url,
+                            text=response.text,
+                            content_type=response.headers.get("content-type", ""),
+                            validators=response_validators(response),
+                        )
+                    error = f"HTTP {response.status_code}"
+                except httpx.TransportError as exc:
+                    error = str(exc) or type(exc).__name__
+                except httpx.HTTPError as exc:
+                    return CrawlResult(url, error=str(exc))
+            if attempt >= self.retries:
+                return CrawlResult(url, error=error)
+            # Back off outside the slots so other hosts keep making progress.
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    async def crawl(
+        self,
+        urls: Iterable[str] | AsyncIterable[str],
+        validators: Callable[[str], dict[str, Any] | None] | None = None,
+    ) -> AsyncIterator[CrawlResult]:
+        """Fetch `urls` concurrently, yielding results as they complete.
+
+        URLs are pulled lazily, with at most `max_concurrency` fetches
+        scheduled, so the source can be a streaming sitemap of any size.
+        `validators` looks up the stored state for a URL to fetch it
+        conditionally.
+        """
+        pending: set[asyncio.Task] = set()
+        iterator = _aiter(urls)
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.max_concurrency:
+                    try:
+                        url = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    state = validators(url) if validators is not None else None
+                    pending.add(asyncio.ensure_future(self.fetch(url, state)))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def iter_sitemap(
+        self,
+        url: str,
+        on_error: Callable[[str, str], None] | None = None,
+        _seen: set[str] | None = None,
+    ) -> AsyncIterator[str]:
+        """Yield page URLs from a sitemap, following nested sitemap indexes.
+
+        Each sitemap file is read to the end and its response closed before
+        any of its URLs are yielded, so a slow consumer cannot hold the
+        connection open into an idle timeout. The protocol caps a file at
+        50,000 URLs, which bounds the list. The XML is parsed incrementally
+        and processed entries are detached from the root, so the tree stays
+        small. Gzipped `.xml.gz` files are inflated on the fly. Failed child
+        sitemaps are reported through `on_error` and skipped; a failure on
+        `url` itself raises.
+        """
+        seen = _seen if _seen is not None else set()
+        if url in seen:
+            return
+        seen.add(url)
+        parser = XMLPullParser(events=("start", "end"))
+        inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if url.endswith(".gz") else None
+        root = None
+        is_index = False
+        locs: list[str] = []
+        async with self.client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for raw in response.aiter_bytes():
+                parser.feed(inflate.decompress(raw) if inflate else raw)
+                for event, element in parser.read_events():
+                    tag = element.tag.rsplit("}", 1)[-1]
+                    if event == "start":
+                        if root is None:
+                            root = element
+                            is_index = tag == "sitemapindex"
+                        continue
+                    if tag == "loc" and element.text and element.text.strip():
+                        locs.append(element.text.strip())
+                    elif tag in {"url", "sitemap"} and root is not None and element in root:
+                        root.remove(element)
+        if not is_index:
+            for loc in locs:
+                yield loc
+            return
+        for child in locs:
+            try:
+                async for loc in self.iter_sitemap(child, on_error, seen):
+                    yield loc
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("sitemap_fetch_failed", extra={"url": child, "error": str(exc)})
+                if on_error is not None:
+                    on_error(child, str(exc))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def _aiter(urls: Iterable[str] | AsyncIterable[str]) -> AsyncIterator[str]:
+    if hasattr(urls, "__aiter__"):
+        async for url in urls:
+            yield url
+    else:
+        for url in urls:
+            yield url
@@ -0,0 +1,84 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batched forward passes.
+
+    One batch runs at a time. A batch starts with the oldest waiting query,
+    takes whatever else is already queued and then waits up to
+    `max_wait_seconds` for more, until `max_batch_size` is reached. Queries
+    arriving while a batch runs form the next one, so batches grow with load
+    even when `max_wait_seconds` is 0.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str]], list[list[float]]],
+        executor: Executor,
+        max_batch_size: int,
+        max_wait_seconds: float,
+        on_batch: Callable[[int, list[float]], None] | None = None,
+    ) -> None:
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_seconds
+        self.on_batch = on_batch
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future, float]] | None = None
+        self._worker: asyncio.Task | None = None
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((text, future, loop.time()))
+        return await future
+
+    async def _collect(self) -> list[tuple[str, asyncio.Future, float]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [item for item in await self._collect() if not item[1].done()]
+            if not batch:
+                continue
+            started = loop.time()
+            if self.on_batch is not None:
+                self.on_batch(len(batch), [started - enqueued for _, _, enqueued in batch])
+            try:
+                embeddings = await loop.run_in_executor(
+                    self.executor, self.embed_batch, [text for text, _, _ in batch]
+                )
+            except Exception as exc:  # noqa: BLE001
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for (_, future, _), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
@@ -0,0 +1,74 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+
+# Approximate per-entry bookkeeping (dict slot, key string header, ndarray header).
+_ENTRY_OVERHEAD = 200
+
+
+class EmbeddingCache:
+    """LRU cache of query text to float32 embedding, bounded by bytes.
+
+    Entries are tagged with the embedding model they came from; a lookup for
+    a different model clears the cache so vectors from two models never mix.
+    """
+
+    def __init__(self, max_bytes: int, model_id: str) -> None:
+        self.max_bytes = max_bytes
+        self.model_id = model_id
+        self.bytes = 0
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _size(text: str, vector: np.ndarray) -> int:
+        return sys.getsizeof(text) + vector.nbytes + _ENTRY_OVERHEAD
+
+    def _check_model(self, model_id: str) -> None:
+        if model_id != self.model_id:
+            self._entries.clear()
+            self.bytes = 0
+            self.model_id = model_id
+
+    def get(self, text: str, model_id: str) -> list[float] | None:
+        with self._lock:
+            self._check_model(model_id)
+            vector = self._entries.get(text)
+            if vector is None:
+                return None
+            self._entries.move_to_end(text)
+        # Retrievers expect plain lists; the compact array stays cached.
+        return vector.tolist()
+
+    def put(self, text: str, embedding: Any, model_id: str) -> int:
+        """Cache an embedding and return how many entries were evicted."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        size = self._size(text, vector)
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            self._check_model(model_id)
+            previous = self._entries.pop(text, None)
+            if previous is not None:
+                self.bytes -= self._size(text, previous)
+            self._entries[text] = vector
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_text, old_vector = self._entries.popitem(last=False)
+                self.bytes -= self._size(old_text, old_vector)
+                evicted += 1
+        return evicted
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+        return count
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from typing import Any
+
+from haystack import Document
+from haystack.components.embedders import (
+    SentenceTransformersDocumentEmbedder,
+    SentenceTransformersTextEmbedder,
+)
+from ray import serve
+from ray.serve import metrics
+
+EMBED_BATCH_MAX_SIZE = int(os.getenv("RAG_EMBED_BATCH_MAX_SIZE", "16"))
+EMBED_BATCH_WAIT_SECONDS = float(os.getenv("RAG_EMBED_BATCH_MAX_WAIT_MS", "0")) / 1000
+
+
+def embed_query_batch(embedder: Any, texts: list[str]) -> list[list[float]]:
+    """Batched equivalent of SentenceTransformersTextEmbedder.run."""
+    backend = getattr(embedder, "embedding_backend", None)
+    if backend is None:
+        return [embedder.run(text=text)["embedding"] for text in texts]
+    return backend.embed(
+        [embedder.prefix + text + embedder.suffix for text in texts],
+        batch_size=len(texts),
+        show_progress_bar=False,
+        normalize_embeddings=embedder.normalize_embeddings,
+        precision=embedder.precision,
+        **(embedder.encode_kwargs or {}),
+    )
+
+
+@serve.deployment(ray_actor_options={"num_cpus": 1})
+class EmbeddingService:
+    """Holds the SentenceTransformers models so ingress replicas do not.
+
+    Query embeddings from all callers are batched with @serve.batch; document
+    embedding requests already arrive as batches. Batch metrics are exported
+    through Ray's metrics endpoint, since this replica does not serve
+    /metrics.
+    """
+
+    def __init__(self) -> None:
+        model = os.getenv("EMBEDDING_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2")
+        self.query_embedder = SentenceTransformersTextEmbedder(model=model)
+        self.document_embedder = SentenceTransformersDocumentEmbedder(model=model)
+        self.query_embedder.warm_up()
+        self.document_embedder.warm_up()
+        self.batch_size_histogram = metrics.Histogram(
+            "rag_embedding_service_batch_size",
+            description="Query embeddings per batched forward pass in the embedding deployment",
+            boundaries=[1, 2, 4, 8, 16, 32, 64],
+        )
+
+    @serve.batch(
+        max_batch_size=EMBED_BATCH_MAX_SIZE,
+        batch_wait_timeout_s=EMBED_BATCH_WAIT_SECONDS,
+    )
+    async def embed_query(self, texts: list[str]) -> list[list[float]]:
+        self.batch_size_histogram.observe(len(texts))
+        # Keep the replica loop free to assemble the next batch.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, embed_query_batch, self.query_embedder, texts
+        )
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        documents = [Document(content=text) for text in texts]
+        embedded = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.document_embedder.run(documents=documents)["documents"]
+        )
+        return [document.embedding for document in embedded]
@@ -0,0 +1,388 @@
+import asyncio
+import codecs
+import functools
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, BinaryIO, Callable, Iterator
+
+from bs4 import BeautifulSoup
+from docx import Document as DocxDocument
+from pypdf import PdfReader
+
+logger = logging.getLogger("rag-app")
+
+# Bytes decoded per step for plain-text uploads.
+TEXT_BLOCK_BYTES = 64 * 1024
+# Upload bytes per extraction part for plain text (and PDF/DOCX read as text).
+TEXT_PART_BYTES = 1024 * 1024
+# Paragraphs per extraction part for DOCX uploads.
+DOCX_PARAGRAPHS_PER_PART = 1000
+
+# (kind, start, stop) over pages, paragraphs or bytes; None is the whole file.
+Part = tuple[str, int, int] | None
+
+
+class ExtractionError(Exception):
+    """Text extraction failed for one source; other sources carry on."""
+
+
+def extract_text_from_html(data: bytes) -> str:
+    try:
+        soup = BeautifulSoup(data.decode("utf-8", errors="ignore"), "html.parser")
+        return soup.get_text(separator=" ", strip=True)
+    except Exception:  # noqa: BLE001
+        return data.decode("utf-8", errors="ignore")
+
+
+def extract_text_from_page(text: str, content_type: str) -> str:
+    if "text/html" in content_type:
+        soup = BeautifulSoup(text, "html.parser")
+        return soup.get_text(separator=" ", strip=True)
+    return text
+
+
+def iter_plain_text(stream: BinaryIO) -> Iterator[str]:
+    # Incremental decoding gives the same text as decoding the whole body.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    while block := stream.read(TEXT_BLOCK_BYTES):
+        if text := decoder.decode(block):
+            yield text
+    if tail := decoder.decode(b"", final=True):
+        yield tail
+
+
+def _utf8_boundary(stream: BinaryIO, offset: int, size: int) -> int:
+    # Step past continuation bytes so no character is split between ranges.
+    if offset <= 0 or offset >= size:
+        return min(max(offset, 0), size)
+    stream.seek(offset)
+    for byte in stream.read(3):
+        if not 0x80 <= byte <= 0xBF:
+            break
+        offset += 1
+    return offset
+
+
+def iter_text_range(stream: BinaryIO, start: int, stop: int) -> Iterator[str]:
+    """Yield the text of bytes `start`..`stop`, both moved to a UTF-8 boundary.
+
+    Consecutive ranges join to exactly the text of iter_plain_text.
+    """
+    size = stream.seek(0, io.SEEK_END)
+    start = _utf8_boundary(stream, start, size)
+    remaining = _utf8_boundary(stream, stop, size) - start
+    stream.seek(start)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    while remaining > 0 and (block := stream.read(min(TEXT_BLOCK_BYTES, remaining))):
+        remaining -= len(block)
+        if text := decoder.decode(block):
+            yield text
+    if tail := decoder.decode(b"", final=True):
+        yield tail
+
+
+def iter_pdf_text(stream: BinaryIO, start: int = 0, stop: int | None = None) -> Iterator[str]:
+    """Yield PDF text page by page, newline separated; pypdf reads lazily.
+
+    `start`/`stop` select a page range. Separators follow the page index, so
+    consecutive ranges join to exactly the text of the whole document.
+    """
+    try:
+        pages = PdfReader(stream).pages
+        page_count = len(pages)
+    except Exception:  # noqa: BLE001
+        stream.seek(0)
+        yield from iter_plain_text(stream)
+        return
+    for index in range(start, page_count if stop is None else min(stop, page_count)):
+        if index:
+            yield "\n"
+        try:
+            yield pages[index].extract_text() or ""
+        except Exception as exc:  # noqa: BLE001
+            # One broken page should not cost the rest of the document.
+            logger.warning("pdf_page_extract_failed", extra={"page": index, "error": str(exc)})
+
+
+def iter_docx_text(stream: BinaryIO) -> Iterator[str]:
+    try:
+        paragraphs = DocxDocument(stream).paragraphs
+    except Exception:  # noqa: BLE001
+        stream.seek(0)
+        yield from iter_plain_text(stream)
+        return
+    for index, paragraph in enumerate(paragraphs):
+        if index:
+            yield "\n"
+        yield paragraph.text
+
+
+def iter_upload_text(upload: Any) -> Iterator[str]:
+    """Yield an upload's text in pieces, reading from its (spooled) file."""
+    upload.file.seek(0)
+    return iter_stream_text(upload.file, upload.filename)
+
+
+def iter_stream_text(stream: BinaryIO, filename: str | None) -> Iterator[str]:
+    name = (filename or "").lower()
+    if name.endswith(".pdf"):
+        yield from iter_pdf_text(stream)
+    elif name.endswith(".docx"):
+        yield from iter_docx_text(stream)
+    elif name.endswith((".html", ".htm")):
+        # The parser needs the whole document; HTML uploads are small.
+        yield extract_text_from_html(stream.read())
+    else:
+        yield from iter_plain_text(stream)
+
+
+def upload_size(upload: Any) -> int:
+    stream = upload.file
+    position = stream.tell()
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(position)
+    return size
+
+
+class SpooledUpload:
+    """Upload copied to memory, or to a named temp file past `max_size` bytes.
+
+    The file is named so extraction worker processes can open it by `path`
+    instead of receiving its bytes.
+    """
+
+    def __init__(self, filename: str | None, file: Any, path: str | None = None) -> None:
+        self.filename = filename
+        self.file = file
+        self.path = path
+
+    @classmethod
+    def copy_of(cls, upload: Any, max_size: int = 1024 * 1024) -> "SpooledUpload":
+        upload.file.seek(0)
+        head = upload.file.read(max_size + 1)
+        if len(head) <= max_size:
+            return cls(upload.filename, io.BytesIO(head))
+        spooled = tempfile.NamedTemporaryFile(prefix="rag-upload-")
+        spooled.write(head)
+        shutil.copyfileobj(upload.file, spooled)
+        spooled.flush()
+        spooled.seek(0)
+        return cls(upload.filename, spooled, path=spooled.name)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def upload_source(upload: Any) -> bytes | str:
+    """What a worker process reads: the spool file's path, or the bytes of a
+    small in-memory upload."""
+    if getattr(upload, "path", None):
+        return upload.path
+    upload.file.seek(0)
+    return upload.file.read()
+
+
+def _open_source(source: bytes | str) -> BinaryIO:
+    return open(source, "rb") if isinstance(source, str) else io.BytesIO(source)
+
+
+def _source_version(source: bytes | str) -> tuple[int, int] | None:
+    if isinstance(source, str):
+        stat = os.stat(source)
+        return stat.st_mtime_ns, stat.st_size
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _docx_paragraphs(source: bytes | str, version: tuple[int, int] | None) -> list[str] | None:
+    # python-docx parses the whole document, so a worker keeps the last one
+    # and parses it once for all the ranges of it that it is handed.
+    with _open_source(source) as stream:
+        try:
+            return [paragraph.text for paragraph in DocxDocument(stream).paragraphs]
+        except Exception:  # noqa: BLE001
+            return None
+
+
+def _ranges(kind: str, total: int, step: int) -> list[Part]:
+    step = max(1, step)
+    return [(kind, start, min(total, start + step)) for start in range(0, total, step)] or [None]
+
+
+def plan_parts(source: bytes | str, filename: str | None, pages_per_part: int) -> list[Part]:
+    """Split a file into parts that each extract to a bounded amount of text.
+
+    PDFs split into page ranges, DOCX into paragraph ranges and plain text
+    (or a PDF/DOCX that does not open) into byte ranges. HTML stays one whole
+    part (None): the parser needs the whole document.
+    """
+    name = (filename or "").lower()
+    if name.endswith((".html", ".htm")):
+        return [None]
+    if name.endswith(".pdf"):
+        with _open_source(source) as stream:
+            try:
+                return _ranges("pages", len(PdfReader(stream).pages), pages_per_part)
+            except Exception:  # noqa: BLE001
+                pass
+    elif name.endswith(".docx"):
+        paragraphs = _docx_paragraphs(source, _source_version(source))
+        if paragraphs is not None:
+            return _ranges("paragraphs", len(paragraphs), DOCX_PARAGRAPHS_PER_PART)
+    with _open_source(source) as stream:
+        return _ranges("bytes", stream.seek(0, io.SEEK_END), TEXT_PART_BYTES)
+
+
+def extract_part(source: bytes | str, filename: str | None, part: Part) -> str:
+    if part is not None and part[0] == "paragraphs":
+        _, start, stop = part
+        paragraphs = _docx_paragraphs(source, _source_version(source))
+        if paragraphs is None:
+            raise ExtractionError("document no longer opens")
+        # Separators follow the paragraph index, as in iter_docx_text.
+        return "".join(("\n" if index else "") + paragraphs[index] for index in range(start, stop))
+    with _open_source(source) as stream:
+        if part is None:
+            return "".join(iter_stream_text(stream, filename))
+        kind, start, stop = part
+        if kind == "pages":
+            return "".join(iter_pdf_text(stream, start, stop))
+        return "".join(iter_text_range(stream, start, stop))
+
+
+class ExtractionPool:
+    """Extracts upload text in a pool of worker processes.
+
+    Text extraction is pure-Python and CPU-bound, so threads would share one
+    core. Each file is split into parts of bounded text (`pages_per_part`
+    PDF pages, DOCX paragraph ranges, byte ranges of plain text; see
+    plan_parts), so no worker result holds a whole large file's text. Parts
+    of all uploads run concurrently, at most `window` ahead of the consumer,
+    and come back in upload and part order.
+    With `workers=0` parts run on `fallback` (a thread pool) instead.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        pages_per_part: int = 8,
+        window: int | None = None,
+        fallback: Executor | None = None,
+    ) -> None:
+        self.workers = max(0, workers)
+        self.pages_per_part = max(1, pages_per_part)
+        self.window = max(1, window or 2 * max(1, self.workers))
+        self.fallback = fallback
+        self._executor: ProcessPoolExecutor | None = None
+        # Spawned rather than forked: the replica process runs threads, and
+        # workers only need this module.
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._retry_lock = asyncio.Lock()
+
+    @property
+    def executor(self) -> Executor | None:
+        if self.workers == 0:
+            return self.fallback
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=self._mp_context
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            self._drop_broken(executor)
+        # A worker that dies (OOM kill, crash in a PDF parser) breaks the pool
+        # and fails every task in flight. Each of them is retried alone in a
+        # fresh single-worker process, so only the input that kills its own
+        # worker fails; the next call rebuilds the shared pool.
+        async with self._retry_lock:
+            isolated = ProcessPoolExecutor(max_workers=1, mp_context=self._mp_context)
+            try:
+                return await loop.run_in_executor(isolated, func, *args)
+            finally:
+                isolated.shutdown(wait=False)
+
+    def _drop_broken(self, executor: Executor | None) -> None:
+        # Tasks failing together all report the same pool; only the first
+        # drops it.
+        if executor is not None and executor is self._executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(self, uploads: list[Any]) -> AsyncIterator[tuple[Any, AsyncIterator[str]]]:
+        """Yield each upload with an iterator over its text parts, in order.
+
+        Consume one upload's parts before moving to the next. A failed upload
+        raises ExtractionError from its iterator; its remaining parts are
+        dropped and the following uploads are unaffected.
+        """
+        sources = [upload_source(upload) for upload in uploads]
+        plans = await asyncio.gather(
+            *(
+                self._run(plan_parts, source, upload.filename, self.pages_per_part)
+                for source, upload in zip(sources, uploads)
+            ),
+            return_exceptions=True,
+        )
+        tasks = [
+            (index, part)
+            for index, plan in enumerate(plans)
+            if not isinstance(plan, BaseException)
+            for part in plan
+        ]
+        in_flight: deque[tuple[int, asyncio.Future]] = deque()
+        position = 0
+
+        def fill() -> None:
+            nonlocal position
+            while position < len(tasks) and len(in_flight) < self.window:
+                index, part = tasks[position]
+                position += 1
+                future = asyncio.ensure_future(
+                    self._run(extract_part, sources[index], uploads[index].filename, part)
+                )
+                in_flight.append((index, future))
+
+        async def parts_of(index: int) -> AsyncIterator[str]:
+            name = uploads[index].filename
+            plan = plans[index]
+            if isinstance(plan, BaseException):
+                raise ExtractionError(f"{name}: {plan}")
+            for _ in plan:
+                fill()
+                _, future = in_flight.popleft()
+                try:
+                    text = await future
+                except Exception as exc:  # noqa: BLE001
+                    raise ExtractionError(f"{name}: {exc}") from exc
+                yield text
+
+        try:
+            for index, upload in enumerate(uploads):
+                fill()
+                yield upload, parts_of(index)
+                # Drop whatever a failed upload left behind.
+                while in_flight and in_flight[0][0] == index:
+                    in_flight.popleft()[1].cancel()
+                while position < len(tasks) and tasks[position][0] == index:
+                    position += 1
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,137 @@
+import asyncio
+import contextlib
+import time
+from typing import Any, AsyncIterator
+
+from ray import serve
+
+from app.vllm_client import Prompt
+from app.vllm_router import VllmRouter
+
+_EMPTY_POOL = {
+    "in_flight": 0,
+    "max_connections": 0,
+    "active_connections": 0,
+    "idle_connections": 0,
+}
+
+
+@serve.deployment(ray_actor_options={"num_cpus": 1})
+class GenerationService:
+    """Proxy from the deployment graph to the vLLM endpoints.
+
+    Owns the VllmRouter (connection pools, health probes, load polling) so
+    ingress replicas scale without multiplying connections to vLLM.
+    """
+
+    def __init__(self) -> None:
+        self.vllm = VllmRouter.from_env()
+
+    async def stream_chat(
+        self, prompt: Prompt, max_tokens: int | None = None
+    ) -> AsyncIterator[str | dict[str, Any]]:
+        # Deltas are strings; the final item carries vLLM's usage.
+        usage: dict[str, int] = {}
+        async for delta in self.vllm.stream_chat(prompt, max_tokens, usage):
+            yield delta
+        yield {"usage": usage}
+
+    async def complete_chat(
+        self, prompt: Prompt, max_tokens: int | None = None
+    ) -> dict[str, Any]:
+        usage: dict[str, int] = {}
+        answer = await self.vllm.complete_chat(prompt, max_tokens, usage)
+        return {"answer": answer, "usage": usage}
+
+    async def warm_prefix(self, messages: list[dict[str, str]]) -> int | None:
+        return await self.vllm.warm_prefix(messages)
+
+    async def load(self) -> dict[str, Any]:
+        self.vllm.start()
+        return {"saturation": self.vllm.saturation(), "pool": self.vllm.pool_stats()}
+
+    async def __del__(self) -> None:
+        await self.vllm.aclose()
+
+
+class RemoteGeneration:
+    """VllmRouter interface backed by a GenerationService handle.
+
+    Saturation and pool stats are polled from the service so load shedding
+    and the pool gauges keep working on the ingress. Per-endpoint state is
+    only visible inside the generation replicas.
+    """
+
+    def __init__(self, handle: Any, max_tokens: int, poll_interval_seconds: float) -> None:
+        self.handle = handle.options(use_new_handle_api=True)
+        self.endpoints: list[Any] = []
+        self.max_tokens = max_tokens
+        self.metrics_interval = poll_interval_seconds
+        self._saturation: float | None = None
+        self._pool = dict(_EMPTY_POOL)
+        self._updated_at: float | None = None
+        self._poll_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.metrics_interval > 0 and (self._poll_task is None or self._poll_task.done()):
+            self._poll_task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def _poll_loop(self) -> None:
+        while True:
+            with contextlib.suppress(Exception):
+                load = await self.handle.load.remote()
+                self._saturation = load.get("saturation")
+                self._pool = load.get("pool") or dict(_EMPTY_POOL)
+                self._updated_at = time.monotonic()
+            await asyncio.sleep(self.metrics_interval)
+
+    def saturation(self) -> float | None:
+        if self._updated_at is None or (
+            time.monotonic() - self._updated_at > 3 * self.metrics_interval
+        ):
+            return None
+        return self._saturation
+
+    def pool_stats(self) -> dict[str, int]:
+        return self._pool
+
+    async def stream_chat(
+        self,
+        prompt: Prompt,
+        max_tokens: int | None = None,
+        usage: dict[str, int] | None = None,
+    ) -> AsyncIterator[str]:
+        response = self.handle.options(stream=True).stream_chat.remote(prompt, max_tokens)
+        finished = False
+        try:
+            async for item in response:
+                if isinstance(item, dict):
+                    if usage is not None:
+                        usage.update(item.get("usage") or {})
+                    continue
+                yield item
+            finished = True
+        finally:
+            cancel = getattr(response, "cancel", None)
+            if not finished and cancel is not None:
+                # Propagate client disconnects so the service aborts vLLM too.
+                cancel()
+
+    async def complete_chat(
+        self,
+        prompt: Prompt,
+        max_tokens: int | None = None,
+        usage: dict[str, int] | None = None,
+    ) -> str:
+        result = await self.handle.complete_chat.remote(prompt, max_tokens)
+        if usage is not None:
+            usage.update(result.get("usage") or {})
+        return result["answer"]
+
+    async def warm_prefix(self, messages: list[dict[str, str]]) -> int | None:
+        return await self.handle.warm_prefix.remote(messages)
+
+    async def aclose(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from app.ingest_pipeline import IngestStats
+
+logger = logging.getLogger("rag-app")
+
+# Error messages kept per ingest; the count is always exact.
+_MAX_REPORTED_ERRORS = 50
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class ErrorLog:
+    """Errors of one ingest: an exact count and the most recent messages.
+
+    A crawl with many failing URLs must not grow a retained job without
+    bound.
+    """
+
+    def __init__(self, keep: int = _MAX_REPORTED_ERRORS) -> None:
+        self.count = 0
+        self.recent: deque[str] = deque(maxlen=keep)
+
+    def append(self, message: str) -> None:
+        self.count += 1
+        self.recent.append(message)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def to_list(self) -> list[str]:
+        return list(self.recent)
+
+
+class IngestJob:
+    """State and live progress of one background ingest."""
+
+    def __init__(self, stats: IngestStats) -> None:
+        self.id = uuid4().hex
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.stats = stats
+        self.errors = ErrorLog()
+        self.result: dict[str, Any] | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {
+                "docs_fetched": self.stats.items["extract"],
+                "chunks_embedded": self.stats.items["embed"],
+                "chunks_written": self.stats.items["write"],
+                "chunks_skipped": self.stats.dedup["skipped"],
+                "chunks_re_embedded": self.stats.dedup["re_embedded"],
+                "chunks_deleted": self.stats.dedup["deleted"],
+                "errors": len(self.errors),
+            },
+            "throughput": self.stats.throughput(),
+            "errors": self.errors.to_list(),
+            "result": self.result,
+        }
+
+
+class IngestJobQueue:
+    """Bounded FIFO of ingest jobs run by a fixed number of worker tasks.
+
+    Finished jobs are retained, oldest first out, so their status stays
+    queryable for a while. Job state lives in this replica only.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queued: int,
+        retained: int,
+        on_record: Callable[[str, int, float], None] | None = None,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retained = retained
+        self.on_record = on_record
+        self.jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self.running = 0
+        self._queue: asyncio.Queue[tuple[IngestJob, Callable[[IngestJob], Awaitable[Any]]]] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get(self, job_id: str) -> IngestJob | None:
+        return self.jobs.get(job_id)
+
+    def submit(self, work: Callable[[IngestJob], Awaitable[dict[str, Any]]]) -> IngestJob:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self.queued >= self.max_queued:
+            raise IngestQueueFull()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._worker()))
+        job = IngestJob(IngestStats(on_record=self.on_record))
+        self.jobs[job.id] = job
+        self._evict()
+        self._queue.put_nowait((job, work))
+        return job
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[: max(0, len(finished) - self.retained)]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job, work = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self.running += 1
+            try:
+                job.result = await work(job)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                raise
+            except Exception as exc:  # noqa: BLE001
+                logger.error("ingest_job_failed", extra={"job_id": job.id, "error": str(exc)})
+                job.errors.append(str(exc))
+                job.status = "failed"
+            finally:
+                self.running -= 1
+                job.finished_at = time.time()
+
+    def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
@@ -0,0 +1,133 @@
+import time
+from typing import Any, Awaitable, Callable, Iterator
+
+from haystack import Document
+
+INGEST_STAGES = ("extract", "chunk", "embed", "write")
+
+
+def iter_chunks(text: str, chunk_size: int = 800, overlap: int = 120) -> Iterator[str]:
+    if len(text) <= chunk_size:
+        yield text
+        return
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_size)
+        yield text[start:end]
+        if end == len(text):
+            return
+        start = max(end - overlap, 0)
+
+
+class StreamChunker:
+    """Chunks text fed in pieces; same output as iter_chunks on the joined text.
+
+    Only the unfinished chunk is buffered, so memory does not grow with the
+    document.
+    """
+
+    def __init__(self, chunk_size: int = 800, overlap: int = 120) -> None:
+        self.chunk_size = chunk_size
+        self.step = chunk_size - overlap
+        self._buffer = ""
+
+    def feed(self, segment: str) -> list[str]:
+        buffer = self._buffer + segment
+        chunks = []
+        start = 0
+        while len(buffer) - start > self.chunk_size:
+            chunks.append(buffer[start : start + self.chunk_size])
+            start += self.step
+        self._buffer = buffer[start:]
+        return chunks
+
+    def finish(self) -> str:
+        return self._buffer
+
+
+class IngestStats:
+    """Item counts and busy seconds per ingest stage for one run.
+
+    `on_record` is called for every sample so the caller can export the same
+    numbers as Prometheus counters.
+    """
+
+    def __init__(self, on_record: Callable[[str, int, float], None] | None = None) -> None:
+        self.items = dict.fromkeys(INGEST_STAGES, 0)
+        self.seconds = dict.fromkeys(INGEST_STAGES, 0.0)
+        # Re-ingest outcomes: chunks left as stored, embedded again for a new
+        # model, or removed because they vanished from their source.
+        self.dedup = {"skipped": 0, "re_embedded": 0, "deleted": 0}
+        self.on_record = on_record
+
+    def record(self, stage: str, items: int, seconds: float) -> None:
+        self.items[stage] += items
+        self.seconds[stage] += seconds
+        if self.on_record is not None:
+            self.on_record(stage, items, seconds)
+
+    def count(self, outcome: str, items: int = 1) -> None:
+        self.dedup[outcome] += items
+
+    def throughput(self) -> dict[str, float]:
+        """Items per busy second for each stage that did any work."""
+        return {
+            stage: round(self.items[stage] / self.seconds[stage], 2)
+            for stage in INGEST_STAGES
+            if self.seconds[stage] > 0
+        }
+
+
+class DocumentBatchWriter:
+    """Embeds and writes chunks in fixed-size batches as they are produced.
+
+    At most `batch_size` chunks are buffered, so memory stays bounded however
+    many sources an ingest covers, and each batch is searchable as soon as it
+    is written. `before_batch` runs ahead of each batch and may wait, which is
+    how background ingest yields to queries.
+    """
+
+    def __init__(
+        self,
+        retrieval: Any,
+        batch_size: int,
+        stats: IngestStats,
+        on_written: Callable[[list[Document]], None] | None = None,
+        before_batch: Callable[[], Awaitable[None]] | None = None,
+    ) -> None:
+        self.retrieval = retrieval
+        self.batch_size = max(1, batch_size)
+        self.stats = stats
+        self.on_written = on_written
+        self.before_batch = before_batch
+        self.written = 0
+        self._pending: list[Document] = []
+
+    async def add(self, document: Document) -> None:
+        self._pending.append(document)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    def discard(self, document_ids: set[str]) -> set[str]:
+        """Drop pending documents with these IDs; returns the IDs dropped."""
+        dropped = {document.id for document in self._pending if document.id in document_ids}
+        if dropped:
+            self._pending = [doc for doc in self._pending if doc.id not in dropped]
+        return dropped
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        if self.before_batch is not None:
+            await self.before_batch()
+        if self.retrieval.use_embeddings:
+            start = time.perf_counter()
+            batch = await self.retrieval.embed_documents(batch)
+            self.stats.record("embed", len(batch), time.perf_counter() - start)
+        start = time.perf_counter()
+        await self.retrieval.write_documents(batch)
+        self.stats.record("write", len(batch), time.perf_counter() - start)
+        self.written += len(batch)
+        if self.on_written is not None:
+            self.on_written(batch)
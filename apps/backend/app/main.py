@@ -1,38 +1,53 @@
-import io
+import asyncio
+import hashlib
 import json
 import logging
+import math
 import os
-import threading
 import time
 from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Any, AsyncIterator
+from typing import Any, AsyncIterator, Callable, TypeVar
 from urllib.parse import quote
 from uuid import uuid4
 
 import requests
-from bs4 import BeautifulSoup
-from pypdf import PdfReader
-from docx import Document as DocxDocument
 from starlette.requests import Request
+from starlette.background import BackgroundTask
 from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from haystack import Document
-from haystack.components.embedders import (
-    SentenceTransformersDocumentEmbedder,
-    SentenceTransformersTextEmbedder,
-)
-from haystack.components.retrievers.in_memory import (
-    InMemoryBM25Retriever,
-    InMemoryEmbeddingRetriever,
-)
-from haystack.document_stores.in_memory import InMemoryDocumentStore
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
-from haystack_integrations.components.retrievers.qdrant import QdrantEmbeddingRetriever
-from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 from pythonjsonlogger import jsonlogger
 from ray import serve
 
-from app.vllm_client import VllmStreamingGenerator
+from app.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from app.answer_cache import AnswerCache
+from app.config import available_cpus, deployment_options, env_flag, ingress_scaling_defaults
+from app.crawler import CrawlResult, Crawler
+from app.embedding_cache import EmbeddingCache
+from app.embedding_service import EmbeddingService
+from app.extraction import (
+    ExtractionError,
+    ExtractionPool,
+    SpooledUpload,
+    extract_text_from_page,
+    upload_size,
+)
+from app.generation_service import GenerationService, RemoteGeneration
+from app.ingest_jobs import ErrorLog, IngestJob, IngestJobQueue, IngestQueueFull
+from app.ingest_pipeline import DocumentBatchWriter, IngestStats, StreamChunker, iter_chunks
+from app.retrieval import RetrievalStage
+from app.retrieval_service import RemoteRetrieval, RetrievalService
+from app.semantic_cache import SemanticCache
+from app.singleflight import SingleFlight
+from app.streaming import DisconnectWatcher, coalesce_deltas, replay_text
+from app.vllm_client import Prompt
+from app.vllm_router import VllmRouter
+
+
+T = TypeVar("T")
 
 
 def configure_logging() -> None:
@@ -44,21 +59,27 @@ def configure_logging() -> None:
     root.handlers = [handler]
 
 
-def env_flag(name: str, default: str = "false") -> bool:
-    return os.getenv(name, default).lower() in {"1", "true", "yes", "on"}
-
-
 def sse(event: str, data: dict[str, Any]) -> bytes:
     return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
 
 
+# Byte-stable instructions shared by every request in the "prefix" prompt layout.
+# Editing this text invalidates vLLM's cached prefix blocks fleet-wide.
+PREFIX_SYSTEM_PROMPT = (
+    "You are a helpful RAG assistant. Answer the user's question using the "
+    "numbered context passages below. Cite passages as [n] where relevant. "
+    "If the context does not contain the answer, say so.\n\n"
+    "Context:\n"
+)
+
 BENCH_REQUIREMENTS = "httpx==0.27.2\n"
 
 BENCH_SCRIPT = """#!/usr/bin/env python3
 \"\"\"
 Lightweight streaming benchmark for /query/stream.
 
-Measures TTFT, TPOT, tokens/sec (approx), and total latency.
+Measures TTFT, TPOT, tokens/sec, and total latency. Token counts come from
+the backend's done event (vLLM usage) and fall back to whitespace estimates.
 Portable across Akamai LKE, AWS EKS, and GCP GKE.
 
 Phase 2 additions:
@@ -116,6 +137,7 @@ async def run_request(
     last_token_time: Optional[float] = None
     token_count = 0
     done_token_count: Optional[int] = None
+    done_prompt_tokens: Optional[int] = None
 
     try:
         async with client.stream("POST", url, json=request_payload) as response:
@@ -145,7 +167,11 @@ async def run_request(
                         last_token_time = current_time
                         token_count += max(1, len(payload.get("text", "").split()))
                     if event_name == "done":
-                        done_token_count = payload.get("token_count")
+                        # Backend reports vLLM usage; whitespace counts are a fallback.
+                        done_token_count = payload.get(
+                            "completion_tokens", payload.get("token_count")
+                        )
+                        done_prompt_tokens = payload.get("prompt_tokens")
                         break
                     event_name = None
                     event_data = None
@@ -167,6 +193,8 @@ async def run_request(
             "total": total,
             "tpot": tpot,
             "token_count": final_token_count,
+            "token_count_source": "server" if done_token_count is not None else "estimated",
+            "prompt_tokens": done_prompt_tokens,
             "tokens_per_second": tokens_per_second,
         }
     except Exception as exc:
@@ -228,6 +256,8 @@ def compute_phase_stats(results: list[dict[str, Any]]) -> dict[str, Any]:
     tokens_per_second = [r["tokens_per_second"] for r in success]
     tpot_values = [r["tpot"] for r in success if r.get("tpot") is not None]
     token_counts = [r["token_count"] for r in success if r.get("token_count")]
+    prompt_token_counts = [r["prompt_tokens"] for r in success if r.get("prompt_tokens")]
+    estimated = [r for r in success if r.get("token_count_source") == "estimated"]
     
     return {
         "requests": len(results),
@@ -246,6 +276,10 @@ def compute_phase_stats(results: list[dict[str, Any]]) -> dict[str, Any]:
         "avg_output_tokens": round(
             statistics.mean(token_counts) if token_counts else 0.0, 1
         ),
+        "avg_prompt_tokens": round(
+            statistics.mean(prompt_token_counts) if prompt_token_counts else 0.0, 1
+        ),
+        "estimated_token_counts": len(estimated),
     }
 
 
@@ -296,6 +330,7 @@ async def run_benchmark(args: argparse.Namespace) -> dict[str, Any]:
         "avg_tokens_per_sec": measured_stats["avg_tokens_per_sec"],
         "total_tokens": measured_stats["total_tokens"],
         "avg_output_tokens": measured_stats["avg_output_tokens"],
+        "avg_prompt_tokens": measured_stats["avg_prompt_tokens"],
         "phases": {
             "warmup": warmup_stats,
             "measured": measured_stats,
@@ -363,68 +398,6 @@ if __name__ == "__main__":
     main()
 """
 
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 120) -> list[str]:
-    if len(text) <= chunk_size:
-        return [text]
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(len(text), start + chunk_size)
-        chunks.append(text[start:end])
-        if end == len(text):
-            break
-        start = max(end - overlap, 0)
-    return chunks
-
-
-def extract_text_from_pdf(data: bytes) -> str:
-    try:
-        reader = PdfReader(io.BytesIO(data))
-        pages = []
-        for page in reader.pages:
-            pages.append(page.extract_text() or "")
-        return "\n".join(pages)
-    except Exception:  # noqa: BLE001
-        return data.decode("utf-8", errors="ignore")
-
-
-def extract_text_from_docx(data: bytes) -> str:
-    try:
-        doc = DocxDocument(io.BytesIO(data))
-        return "\n".join(para.text for para in doc.paragraphs)
-    except Exception:  # noqa: BLE001
-        return data.decode("utf-8", errors="ignore")
-
-
-def extract_text_from_html(data: bytes) -> str:
-    try:
-        soup = BeautifulSoup(data.decode("utf-8", errors="ignore"), "html.parser")
-        return soup.get_text(separator=" ", strip=True)
-    except Exception:  # noqa: BLE001
-        return data.decode("utf-8", errors="ignore")
-
-
-def load_text_from_upload(upload: Any) -> str:
-    data = upload.file.read()
-    if upload.filename and upload.filename.lower().endswith(".pdf"):
-        return extract_text_from_pdf(data)
-    if upload.filename and upload.filename.lower().endswith(".docx"):
-        return extract_text_from_docx(data)
-    if upload.filename and upload.filename.lower().endswith((".html", ".htm")):
-        return extract_text_from_html(data)
-    return data.decode("utf-8", errors="ignore")
-
-
-def load_text_from_url(url: str, timeout: int = 10) -> str:
-    response = requests.get(url, timeout=timeout)
-    response.raise_for_status()
-    content_type = response.headers.get("content-type", "")
-    if "text/html" in content_type:
-        soup = BeautifulSoup(response.text, "html.parser")
-        return soup.get_text(separator=" ", strip=True)
-    return response.text
-
-
 class TimingTracker:
     def __init__(self, maxlen: int = 200) -> None:
         self.samples: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=maxlen))
@@ -450,7 +423,12 @@ class TimingTracker:
 
 @serve.deployment(ray_actor_options={"num_cpus": 1})
 class RagApp:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        embedding_service: Any | None = None,
+        retrieval_service: Any | None = None,
+        generation_service: Any | None = None,
+    ) -> None:
         configure_logging()
         self.logger = logging.getLogger("rag-app")
         self.request_counter = Counter(
@@ -474,7 +452,7 @@ class RagApp:
         )
         self.tokens_per_second_histogram = Histogram(
             "rag_tokens_per_second",
-            "Tokens per second (estimated)",
+            "Completion tokens per second",
         )
         self.tpot_histogram = Histogram(
             "rag_tpot_seconds",
@@ -482,32 +460,239 @@ class RagApp:
         )
         self.token_counter = Counter(
             "rag_tokens_total",
-            "Total tokens generated (estimated)",
+            "Total completion tokens generated (vLLM usage; estimated when unavailable)",
+        )
+        self.prompt_tokens_histogram = Histogram(
+            "rag_prompt_tokens",
+            "Prompt tokens per generation as reported by vLLM (prefill cost)",
+            buckets=[64, 128, 256, 512, 1024, 1536, 2048, 3072, 4096, 8192],
         )
         self.k_retrieved_histogram = Histogram(
             "rag_k_retrieved",
             "Number of documents retrieved per query",
             buckets=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 15, 20],
         )
+        self.stream_events_counter = Counter(
+            "rag_stream_events_total",
+            "SSE events sent on /query/stream",
+            ["event"],
+        )
+        self.stream_bytes_counter = Counter(
+            "rag_stream_bytes_total",
+            "Bytes of token events sent on /query/stream",
+        )
+        self.stream_bytes_per_token_histogram = Histogram(
+            "rag_stream_bytes_per_token",
+            "Token event bytes per generated token, per stream",
+            buckets=[8, 16, 24, 32, 48, 64, 96, 128, 256],
+        )
+        self.stream_events_per_second_histogram = Histogram(
+            "rag_stream_events_per_second",
+            "Token events per second, per stream",
+            buckets=[1, 5, 10, 20, 30, 50, 75, 100, 200],
+        )
+        self.answer_cache_counter = Counter(
+            "rag_answer_cache_events_total",
+            "Answer cache events (hit, miss, eviction, invalidation)",
+            ["event"],
+        )
+        self.answer_cache_bytes_gauge = Gauge(
+            "rag_answer_cache_bytes",
+            "Approximate bytes held by the answer cache",
+        )
+        self.semantic_cache_counter = Counter(
+            "rag_semantic_cache_events_total",
+            "Semantic cache events (hit, miss, invalidation)",
+            ["event"],
+        )
+        self.semantic_cache_lookup_histogram = Histogram(
+            "rag_semantic_cache_lookup_seconds",
+            "Latency added by semantic cache lookups",
+            buckets=[0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025],
+        )
+        self.singleflight_joins_counter = Counter(
+            "rag_singleflight_joins_total",
+            "Streams served by joining an identical in-flight generation (GPU generations saved)",
+        )
+        self.singleflight_inflight_gauge = Gauge(
+            "rag_singleflight_inflight",
+            "Shared upstream generations currently in flight",
+        )
+        self.prompt_prefix_tokens_gauge = Gauge(
+            "rag_prompt_prefix_tokens",
+            "Tokens in the shared prompt prefix warmed into the vLLM prefix cache",
+        )
+        self.admission_in_flight_gauge = Gauge(
+            "rag_admission_in_flight",
+            "Admitted /query and /query/stream requests currently in flight",
+        )
+        self.admission_queue_gauge = Gauge(
+            "rag_admission_queue_depth",
+            "Requests waiting in the admission queue",
+        )
+        self.admission_wait_histogram = Histogram(
+            "rag_admission_wait_seconds",
+            "Time admitted requests spent waiting in the admission queue",
+            buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+        )
+        self.admission_rejected_counter = Counter(
+            "rag_admission_rejected_total",
+            "Requests rejected with 429 by admission control",
+            ["reason"],
+        )
+        self.load_shed_counter = Counter(
+            "rag_load_shed_total",
+            "Generations delayed, downgraded or rejected because vLLM was saturated",
+            ["action"],
+        )
+        self.load_shed_delay_histogram = Histogram(
+            "rag_load_shed_delay_seconds",
+            "Time generations were held back waiting for vLLM saturation to drop",
+            buckets=[0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10],
+        )
+        self.cancelled_streams_counter = Counter(
+            "rag_cancelled_streams_total",
+            "Streams abandoned by the client before completion, by how it was detected",
+            ["reason"],
+        )
+        self.cancelled_tokens_saved_counter = Counter(
+            "rag_cancelled_stream_tokens_saved_total",
+            "Upper bound of completion tokens not generated because the upstream was aborted",
+        )
+        self.event_loop_lag_histogram = Histogram(
+            "rag_event_loop_lag_seconds",
+            "How late the replica event loop wakes up from a scheduled sleep",
+            buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+        )
+        self.ingest_items_counter = Counter(
+            "rag_ingest_items_total",
+            "Items processed by ingest stage (extract: sources, chunk/embed/write: chunks)",
+            ["stage"],
+        )
+        self.ingest_stage_seconds_counter = Counter(
+            "rag_ingest_stage_seconds_total",
+            "Busy seconds spent in each ingest stage",
+            ["stage"],
+        )
+        self.ingest_jobs_gauge = Gauge(
+            "rag_ingest_jobs",
+            "Background ingest jobs by state (queued, running)",
+            ["state"],
+        )
+        self.ingest_jobs_counter = Counter(
+            "rag_ingest_jobs_total",
+            "Background ingest jobs by outcome (submitted, rejected)",
+            ["outcome"],
+        )
+        self.url_refresh_counter = Counter(
+            "rag_ingest_url_refresh_total",
+            "Re-ingested URLs by outcome (not_modified, unchanged, changed)",
+            ["outcome"],
+        )
+        self.ingest_dedup_counter = Counter(
+            "rag_ingest_dedup_total",
+            "Re-ingested chunks by outcome (skipped, re_embedded, deleted)",
+            ["outcome"],
+        )
+        self.ingest_paused_counter = Counter(
+            "rag_ingest_paused_batches_total",
+            "Background ingest batches delayed to let queued queries run first",
+        )
+        self.embedding_batch_size_histogram = Histogram(
+            "rag_embedding_batch_size",
+            "Query embeddings per batched forward pass",
+            buckets=[1, 2, 4, 8, 16, 32, 64],
+        )
+        self.embedding_batch_wait_histogram = Histogram(
+            "rag_embedding_batch_wait_seconds",
+            "Time a query waited for its embedding batch to start",
+            buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25],
+        )
+        self.embedding_cache_counter = Counter(
+            "rag_embedding_cache_events_total",
+            "Query embedding cache events (hit, miss, eviction)",
+            ["event"],
+        )
+        self.embedding_cache_bytes_gauge = Gauge(
+            "rag_embedding_cache_bytes",
+            "Approximate bytes held by the query embedding cache",
+        )
         self.timings = TimingTracker()
-        self.use_embeddings = env_flag("RAG_USE_EMBEDDINGS", "true")
-        self.qdrant_url = os.getenv("QDRANT_URL", "")
-        self.qdrant_collection = os.getenv("QDRANT_COLLECTION", "rag-documents")
-        self.embedding_model = os.getenv(
-            "EMBEDDING_MODEL_ID",
-            "sentence-transformers/all-MiniLM-L6-v2",
-        )
-        self.embedding_dim = int(os.getenv("EMBEDDING_DIM", "384"))
-        self.vllm_base_url = os.getenv("VLLM_BASE_URL", "http://vllm:8000")
         self.vllm_model = os.getenv("VLLM_MODEL", "Qwen/Qwen2.5-7B-Instruct")
         self.vllm_max_tokens = int(os.getenv("VLLM_MAX_TOKENS", "512"))
         self.vllm_temperature = float(os.getenv("VLLM_TEMPERATURE", "0.2"))
         self.vllm_top_p = float(os.getenv("VLLM_TOP_P", "0.95"))
-        self.vllm_timeout_seconds = int(os.getenv("VLLM_TIMEOUT_SECONDS", "30"))
+        self.vllm_metrics_interval = float(os.getenv("VLLM_METRICS_INTERVAL_SECONDS", "2"))
+        self.load_shedding = env_flag("RAG_LOAD_SHEDDING_ENABLED")
+        self.shed_delay_at = float(os.getenv("RAG_SHED_DELAY_AT", "0.85"))
+        self.shed_max_delay_seconds = float(os.getenv("RAG_SHED_MAX_DELAY_SECONDS", "2"))
+        self.shed_downgrade_at = float(os.getenv("RAG_SHED_DOWNGRADE_AT", "0.92"))
+        self.shed_downgrade_max_tokens = int(os.getenv("RAG_SHED_DOWNGRADE_MAX_TOKENS", "128"))
+        self.shed_reject_at = float(os.getenv("RAG_SHED_REJECT_AT", "0.98"))
         self.max_history = int(os.getenv("RAG_MAX_HISTORY", "6"))
-        self.top_k = int(os.getenv("RAG_TOP_K", "4"))
+        self.prompt_layout = os.getenv("RAG_PROMPT_LAYOUT", "legacy").lower()
+        self.prompt_prefix_warmup = env_flag("RAG_PROMPT_PREFIX_WARMUP", "true")
+        self.stream_coalesce_seconds = float(os.getenv("RAG_STREAM_COALESCE_MS", "0")) / 1000
+        self.stream_coalesce_tokens = int(os.getenv("RAG_STREAM_COALESCE_TOKENS", "8"))
+        self.disconnect_poll_seconds = float(os.getenv("RAG_DISCONNECT_POLL_MS", "250")) / 1000
+        self.loop_lag_interval_seconds = float(os.getenv("RAG_LOOP_LAG_INTERVAL_MS", "100")) / 1000
+        # Separate pools so a large ingest cannot starve query embedding and
+        # retrieval; the event loop itself only does I/O.
+        self.query_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_QUERY_STAGE_WORKERS", "4")),
+            thread_name_prefix="rag-query",
+        )
+        self.ingest_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_INGEST_STAGE_WORKERS", "2")),
+            thread_name_prefix="rag-ingest",
+        )
+        self.ingest_batch_size = int(os.getenv("RAG_INGEST_BATCH_SIZE", "64"))
+        self.max_upload_bytes = int(os.getenv("RAG_MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+        self.upload_spool_bytes = int(os.getenv("RAG_UPLOAD_SPOOL_MAX_BYTES", str(1024 * 1024)))
+        self.ingest_pause_in_flight = int(os.getenv("RAG_INGEST_PAUSE_IN_FLIGHT", "0"))
+        self.ingest_max_pause_seconds = float(os.getenv("RAG_INGEST_MAX_PAUSE_SECONDS", "5"))
+        self.ingest_jobs = IngestJobQueue(
+            workers=int(os.getenv("RAG_INGEST_JOB_WORKERS", "1")),
+            max_queued=int(os.getenv("RAG_INGEST_JOB_QUEUE_SIZE", "16")),
+            retained=int(os.getenv("RAG_INGEST_JOBS_RETAINED", "100")),
+            on_record=self._observe_ingest_stage,
+        )
+        self.ingest_jobs_gauge.labels("queued").set_function(lambda: self.ingest_jobs.queued)
+        self.ingest_jobs_gauge.labels("running").set_function(lambda: self.ingest_jobs.running)
+        self.extraction = ExtractionPool(
+            workers=int(os.getenv("RAG_EXTRACT_WORKERS", str(available_cpus()))),
+            pages_per_part=int(os.getenv("RAG_EXTRACT_PAGES_PER_PART", "8")),
+            fallback=self.ingest_executor,
+        )
+        self.crawler = Crawler(
+            max_concurrency=int(os.getenv("RAG_CRAWL_CONCURRENCY", "16")),
+            per_host=int(os.getenv("RAG_CRAWL_PER_HOST", "4")),
+            timeout_seconds=float(os.getenv("RAG_CRAWL_TIMEOUT_SECONDS", "10")),
+            retries=int(os.getenv("RAG_CRAWL_RETRIES", "3")),
+            backoff_seconds=float(os.getenv("RAG_CRAWL_BACKOFF_SECONDS", "0.5")),
+        )
+        self.admission = AdmissionController(
+            max_in_flight=int(os.getenv("RAG_MAX_IN_FLIGHT", "0")),
+            max_queue=int(os.getenv("RAG_ADMISSION_QUEUE_SIZE", "64")),
+            queue_timeout_seconds=float(os.getenv("RAG_ADMISSION_QUEUE_TIMEOUT_SECONDS", "10")),
+            retry_after_seconds=float(os.getenv("RAG_ADMISSION_RETRY_AFTER_SECONDS", "1")),
+        )
+        self.admission_in_flight_gauge.set_function(lambda: self.admission.in_flight)
+        self.admission_queue_gauge.set_function(lambda: self.admission.queue_depth)
         self.sessions: dict[str, list[dict[str, str]]] = {}
         self.ingest_index: dict[str, set[str]] = defaultdict(set)
+        # ETag, Last-Modified and content hash per URL ingest key.
+        self.url_validators: dict[str, dict[str, Any]] = {}
+        self.store_version = 0
+        self.answer_cache = self._build_answer_cache()
+        self.semantic_cache = self._build_semantic_cache()
+        self.single_flight = SingleFlight() if env_flag("RAG_SINGLEFLIGHT_ENABLED") else None
+        self.singleflight_inflight_gauge.set_function(
+            lambda: len(self.single_flight) if self.single_flight else 0
+        )
+        self.answer_cache_bytes_gauge.set_function(
+            lambda: self.answer_cache.bytes if self.answer_cache else 0
+        )
         self.provider = os.getenv("RAG_PROVIDER", "unknown")
         self.kube_namespace = os.getenv("KUBE_NAMESPACE") or os.getenv("KUBERNETES_NAMESPACE", "rag-app")
         self.bench_target_url = os.getenv(
@@ -518,106 +703,168 @@ class RagApp:
         self.bench_ttl_seconds = int(os.getenv("BENCH_TTL_SECONDS", "3600"))
         self._kube_api = self._build_kube_api()
 
-        self.document_store = self._build_document_store()
-        if self.qdrant_url:
-            self.use_embeddings = True
-        self.retriever = self._build_retriever()
-        self.document_embedder = self._build_document_embedder()
-        self.query_embedder = self._build_query_embedder()
-        self.vllm = self._build_vllm_client()
-        self._embedder_lock = threading.Lock()
-        self._embedder_ready = {"document": False, "query": False}
-        self._warm_up_embedders()
-
-    def _warm_up_embedders(self) -> None:
-        for name, embedder in (
-            ("document", self.document_embedder),
-            ("query", self.query_embedder),
-        ):
-            if embedder is None:
-                continue
-            warm_up = getattr(embedder, "warm_up", None)
-            if callable(warm_up):
-                try:
-                    warm_up()
-                    self._embedder_ready[name] = True
-                except Exception as exc:  # noqa: BLE001
-                    self.logger.warning(
-                        "embedder_warmup_failed",
-                        extra={"embedder": name, "error": str(exc)},
-                    )
-                    raise
+        # In the deployment graph retrieval and generation run in their own
+        # deployments and this replica only holds handles to them.
+        if retrieval_service is not None:
+            self.retrieval = RemoteRetrieval(retrieval_service)
+        else:
+            self.retrieval = RetrievalStage(
+                self.query_executor,
+                self.ingest_executor,
+                embedding_service=(
+                    embedding_service.options(use_new_handle_api=True)
+                    if embedding_service is not None
+                    else None
+                ),
+                on_batch=self._observe_embedding_batch,
+            )
+        self.embedding_cache = self._build_embedding_cache()
+        self.embedding_cache_bytes_gauge.set_function(
+            lambda: self.embedding_cache.bytes if self.embedding_cache else 0
+        )
+        if generation_service is not None:
+            self.vllm = RemoteGeneration(
+                generation_service, self.vllm_max_tokens, self.vllm_metrics_interval
+            )
+        else:
+            self.vllm = VllmRouter.from_env()
+        self.vllm_pool_gauge = Gauge(
+            "rag_vllm_pool_connections",
+            "vLLM client pool connections by state",
+            ["state"],
+        )
+        self.vllm_pool_gauge.labels("active").set_function(
+            lambda: self.vllm.pool_stats()["active_connections"]
+        )
+        self.vllm_pool_gauge.labels("idle").set_function(
+            lambda: self.vllm.pool_stats()["idle_connections"]
+        )
+        self.vllm_pool_gauge.labels("max").set_function(
+            lambda: self.vllm.pool_stats()["max_connections"]
+        )
+        self.vllm_in_flight_gauge = Gauge(
+            "rag_vllm_in_flight_requests",
+            "Requests currently in flight to vLLM",
+        )
+        self.vllm_in_flight_gauge.set_function(lambda: self.vllm.pool_stats()["in_flight"])
+        self.vllm_endpoint_gauge = Gauge(
+            "rag_vllm_endpoint",
+            "Per-endpoint vLLM routing state (in_flight, healthy, ttft_ewma_seconds, kv_cache_usage)",
+            ["endpoint", "field"],
+        )
+        self.vllm_upstream_queue_gauge = Gauge(
+            "rag_vllm_upstream_queue_depth",
+            "Requests waiting inside vLLM (vllm:num_requests_waiting) per endpoint",
+            ["endpoint"],
+        )
+        for endpoint in self.vllm.endpoints:
+            self.vllm_endpoint_gauge.labels(endpoint.url, "in_flight").set_function(
+                lambda endpoint=endpoint: endpoint.in_flight
+            )
+            self.vllm_endpoint_gauge.labels(endpoint.url, "healthy").set_function(
+                lambda endpoint=endpoint: 1 if endpoint.healthy else 0
+            )
+            self.vllm_endpoint_gauge.labels(endpoint.url, "ttft_ewma_seconds").set_function(
+                lambda endpoint=endpoint: endpoint.ttft_ewma or 0.0
+            )
+            self.vllm_endpoint_gauge.labels(endpoint.url, "kv_cache_usage").set_function(
+                lambda endpoint=endpoint: endpoint.kv_cache_usage
+            )
+            self.vllm_upstream_queue_gauge.labels(endpoint.url).set_function(
+                lambda endpoint=endpoint: endpoint.waiting
+            )
+        self.vllm_saturation_gauge = Gauge(
+            "rag_vllm_saturation",
+            "Saturation of the least-loaded healthy vLLM endpoint (1.0 = KV cache or queue full)",
+        )
+        self.vllm_saturation_gauge.set_function(lambda: self.vllm.saturation() or 0.0)
+        self._background_started = False
+        self._start_background_tasks()
 
-    def _ensure_query_embedder_ready(self) -> None:
-        if not self.query_embedder:
+    def _start_background_tasks(self) -> None:
+        """Start replica background work once an event loop is running."""
+        if self._background_started:
             return
-        if self._embedder_ready.get("query"):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Constructed outside the loop; retried from the first request.
             return
-        with self._embedder_lock:
-            if self._embedder_ready.get("query"):
-                return
-            warm_up = getattr(self.query_embedder, "warm_up", None)
-            if callable(warm_up):
-                try:
-                    warm_up()
-                except Exception:  # noqa: BLE001
-                    raise
-            self._embedder_ready["query"] = True
+        self._background_started = True
+        self.vllm.start()
+        if self.loop_lag_interval_seconds > 0:
+            loop.create_task(self._monitor_event_loop_lag())
+        if self.prompt_layout == "prefix" and self.prompt_prefix_warmup:
+            loop.create_task(self._warm_prompt_prefix())
+
+    async def _monitor_event_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time()
+            await asyncio.sleep(self.loop_lag_interval_seconds)
+            lag = loop.time() - scheduled - self.loop_lag_interval_seconds
+            self.event_loop_lag_histogram.observe(max(0.0, lag))
+
+    async def _run_ingest_stage(self, func: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.ingest_executor, partial(func, *args)
+        )
 
-    def _ensure_document_embedder_ready(self) -> None:
-        if not self.document_embedder:
-            return
-        if self._embedder_ready.get("document"):
+    async def _warm_prompt_prefix(self) -> None:
+        messages = [{"role": "system", "content": PREFIX_SYSTEM_PROMPT}]
+        try:
+            prefix_tokens = await self.vllm.warm_prefix(messages)
+        except Exception as exc:  # noqa: BLE001
+            self.logger.warning("prompt_prefix_warmup_failed", extra={"error": str(exc)})
             return
-        with self._embedder_lock:
-            if self._embedder_ready.get("document"):
-                return
-            warm_up = getattr(self.document_embedder, "warm_up", None)
-            if callable(warm_up):
-                try:
-                    warm_up()
-                except Exception:  # noqa: BLE001
-                    raise
-            self._embedder_ready["document"] = True
-
-    def _build_document_store(self) -> Any:
-        if self.qdrant_url:
-            return QdrantDocumentStore(
-                url=self.qdrant_url,
-                index=self.qdrant_collection,
-                embedding_dim=self.embedding_dim,
-            )
-        return InMemoryDocumentStore()
-
-    def _build_retriever(self) -> Any:
-        if self.use_embeddings:
-            if self.qdrant_url:
-                return QdrantEmbeddingRetriever(document_store=self.document_store)
-            return InMemoryEmbeddingRetriever(document_store=self.document_store)
-        if isinstance(self.document_store, InMemoryDocumentStore):
-            return InMemoryBM25Retriever(document_store=self.document_store)
-        raise ValueError("BM25 retriever is only supported with in-memory store.")
-
-    def _build_document_embedder(self) -> Any | None:
-        if not self.use_embeddings:
+        if prefix_tokens is not None:
+            self.prompt_prefix_tokens_gauge.set(prefix_tokens)
+        self.logger.info("prompt_prefix_warmed", extra={"prefix_tokens": prefix_tokens})
+
+    def _build_embedding_cache(self) -> EmbeddingCache | None:
+        max_bytes = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+        if not self.retrieval.use_embeddings or max_bytes <= 0:
             return None
-        return SentenceTransformersDocumentEmbedder(model=self.embedding_model)
+        return EmbeddingCache(max_bytes=max_bytes, model_id=self.retrieval.embedding_model)
 
-    def _build_query_embedder(self) -> Any | None:
-        if not self.use_embeddings:
+    def _observe_embedding_batch(self, size: int, waits: list[float]) -> None:
+        self.embedding_batch_size_histogram.observe(size)
+        for wait in waits:
+            self.embedding_batch_wait_histogram.observe(wait)
+
+    def _observe_ingest_stage(self, stage: str, items: int, seconds: float) -> None:
+        self.ingest_items_counter.labels(stage).inc(items)
+        self.ingest_stage_seconds_counter.labels(stage).inc(seconds)
+
+    def _build_answer_cache(self) -> AnswerCache | None:
+        if not env_flag("RAG_ANSWER_CACHE_ENABLED"):
             return None
-        return SentenceTransformersTextEmbedder(model=self.embedding_model)
+        return AnswerCache(
+            max_entries=int(os.getenv("RAG_ANSWER_CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(os.getenv("RAG_ANSWER_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("RAG_ANSWER_CACHE_TTL_SECONDS", "600")),
+            policy=os.getenv("RAG_ANSWER_CACHE_POLICY", "lru").lower(),
+        )
 
-    def _build_vllm_client(self) -> VllmStreamingGenerator:
-        return VllmStreamingGenerator(
-            base_url=self.vllm_base_url,
-            model=self.vllm_model,
-            max_tokens=self.vllm_max_tokens,
-            temperature=self.vllm_temperature,
-            top_p=self.vllm_top_p,
-            timeout_seconds=self.vllm_timeout_seconds,
+    def _build_semantic_cache(self) -> SemanticCache | None:
+        if not env_flag("RAG_SEMANTIC_CACHE_ENABLED"):
+            return None
+        return SemanticCache(
+            max_entries=int(os.getenv("RAG_SEMANTIC_CACHE_MAX_ENTRIES", "2048")),
+            threshold=float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            ttl_seconds=float(os.getenv("RAG_SEMANTIC_CACHE_TTL_SECONDS", "600")),
         )
 
+    async def __del__(self) -> None:
+        # Ray Serve awaits an async __del__ on graceful replica shutdown.
+        await self.vllm.aclose()
+        await self.crawler.aclose()
+        self.ingest_jobs.close()
+        self.retrieval.close()
+        self.query_executor.shutdown(wait=False, cancel_futures=True)
+        self.ingest_executor.shutdown(wait=False, cancel_futures=True)
+        self.extraction.close()
+
     def _build_kube_api(self) -> dict[str, Any] | None:
         """Build K8s API config. Token is read fresh each request to handle rotation."""
         host = os.getenv("KUBERNETES_SERVICE_HOST")
@@ -897,7 +1144,11 @@ class RagApp:
         doc_meta = dict(meta)
         if key:
             doc_meta.setdefault("ingest_key", key)
-        return Document(id=str(uuid4()), content=content, meta=doc_meta)
+        # Deterministic per key and content, so re-ingesting is idempotent.
+        digest = hashlib.sha256(
+            f"{doc_meta.get('ingest_key', '')}\x00{content}".encode("utf-8")
+        ).hexdigest()
+        return Document(id=digest, content=content, meta=doc_meta)
 
     def _track_documents(self, key: str | None, docs: list[Document]) -> None:
         if not key:
@@ -918,6 +1169,206 @@ class RagApp:
         if len(history) > self.max_history:
             self.sessions[session_id] = history[-self.max_history :]
 
+    def _on_store_changed(self) -> None:
+        self.store_version += 1
+        if self.answer_cache and self.answer_cache.clear():
+            self.answer_cache_counter.labels("invalidation").inc()
+        if self.semantic_cache and self.semantic_cache.clear():
+            self.semantic_cache_counter.labels("invalidation").inc()
+
+    async def _query_embedding(self, query: str) -> Any | None:
+        if not self.retrieval.use_embeddings:
+            return None
+        model_id = self.retrieval.embedding_model
+        if self.embedding_cache is not None:
+            embedding = self.embedding_cache.get(query, model_id)
+            if embedding is not None:
+                self.embedding_cache_counter.labels("hit").inc()
+                return embedding
+            self.embedding_cache_counter.labels("miss").inc()
+        embedding = await self.retrieval.embed_query(query)
+        if self.embedding_cache is not None and embedding is not None:
+            evicted = self.embedding_cache.put(query, embedding, model_id)
+            if evicted:
+                self.embedding_cache_counter.labels("eviction").inc(evicted)
+        return embedding
+
+    def _semantic_cache_embedding(
+        self,
+        payload: dict[str, Any],
+        query: str,
+        history: list[dict[str, str]],
+        embedding: Any | None,
+        max_tokens: int | None,
+    ) -> Any | None:
+        """Return the embedding to use for the semantic cache, if the request is eligible."""
+        if embedding is None or not self.semantic_cache:
+            return None
+        if payload.get("cache") is False or max_tokens is not None:
+            return None
+        # Only stateless questions: earlier turns would change the answer.
+        if history[-self.max_history :] not in ([], [{"role": "user", "content": query}]):
+            return None
+        return embedding
+
+    def _semantic_cache_get(self, embedding: Any | None) -> dict[str, Any] | None:
+        if embedding is None:
+            return None
+        lookup_start = time.perf_counter()
+        cached, _ = self.semantic_cache.lookup(embedding)
+        self.semantic_cache_lookup_histogram.observe(time.perf_counter() - lookup_start)
+        self.semantic_cache_counter.labels("hit" if cached else "miss").inc()
+        return cached
+
+    def _answer_cache_key(
+        self,
+        payload: dict[str, Any],
+        query: str,
+        history: list[dict[str, str]],
+        documents: list[Document],
+        max_tokens: int | None,
+    ) -> str | None:
+        if not self.answer_cache or payload.get("cache") is False:
+            return None
+        return AnswerCache.make_key(
+            query,
+            [doc.id for doc in documents],
+            history[-self.max_history :],
+            {
+                "model": self.vllm_model,
+                "max_tokens": max_tokens or self.vllm_max_tokens,
+                "temperature": self.vllm_temperature,
+                "top_p": self.vllm_top_p,
+            },
+        )
+
+    def _answer_cache_get(self, key: str | None) -> dict[str, Any] | None:
+        if key is None:
+            return None
+        cached = self.answer_cache.get(key)
+        self.answer_cache_counter.labels("hit" if cached else "miss").inc()
+        return cached
+
+    def _generation_stream(
+        self,
+        payload: dict[str, Any],
+        prompt: Prompt,
+        max_tokens: int | None,
+    ) -> tuple[AsyncIterator[str], dict[str, int], bool]:
+        """Start (or join) the upstream generation.
+
+        Returns the delta stream, the dict vLLM usage is written into and
+        whether an in-flight generation was joined.
+        """
+        if not self.single_flight or payload.get("cache") is False:
+            usage: dict[str, int] = {}
+            return self.vllm.stream_chat(prompt, max_tokens, usage), usage, False
+        key = SingleFlight.make_key(
+            prompt,
+            {
+                "model": self.vllm_model,
+                "max_tokens": max_tokens or self.vllm_max_tokens,
+                "temperature": self.vllm_temperature,
+                "top_p": self.vllm_top_p,
+            },
+        )
+        stream, usage, joined = self.single_flight.stream(
+            key, lambda usage: self.vllm.stream_chat(prompt, max_tokens, usage)
+        )
+        if joined:
+            self.singleflight_joins_counter.inc()
+        return stream, usage, joined
+
+    def _cache_answer(
+        self,
+        cache_key: str | None,
+        semantic_embedding: Any | None,
+        answer: str,
+        usage: dict[str, int],
+        documents: list[Document],
+        store_version: int,
+    ) -> None:
+        # Skip answers generated against a store that changed mid-request.
+        if not answer or store_version != self.store_version:
+            return
+        if cache_key is not None:
+            evicted = self.answer_cache.put(
+                cache_key, {"answer": answer, "usage": dict(usage)}
+            )
+            if evicted:
+                self.answer_cache_counter.labels("eviction").inc(evicted)
+        if semantic_embedding is not None:
+            self.semantic_cache.put(
+                semantic_embedding,
+                {"answer": answer, "usage": dict(usage), "documents": documents},
+            )
+
+    async def _admit(self) -> AdmissionTicket:
+        try:
+            ticket = await self.admission.acquire()
+        except AdmissionRejected as exc:
+            self.admission_rejected_counter.labels(exc.reason).inc()
+            raise
+        self.admission_wait_histogram.observe(ticket.wait_seconds)
+        self.latency_histogram.labels("queue").observe(ticket.wait_seconds)
+        self.timings.record("queue", ticket.wait_seconds)
+        return ticket
+
+    async def _shed_load(self, max_tokens: int | None) -> tuple[int | None, bool]:
+        """Apply the vLLM saturation policy before starting a generation.
+
+        Moderately saturated upstreams delay the request briefly, heavily
+        saturated ones cap max_tokens, and a full upstream is rejected with
+        AdmissionRejected. Returns the max_tokens to use and whether it was
+        downgraded.
+        """
+        if not self.load_shedding:
+            return max_tokens, False
+        score = self.vllm.saturation()
+        if score is not None and self.shed_delay_at <= score < self.shed_reject_at:
+            self.load_shed_counter.labels("delayed").inc()
+            start = time.perf_counter()
+            deadline = start + self.shed_max_delay_seconds
+            while score is not None and score >= self.shed_delay_at:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, self.vllm_metrics_interval / 2))
+                score = self.vllm.saturation()
+            self.load_shed_delay_histogram.observe(time.perf_counter() - start)
+        if score is None:
+            return max_tokens, False
+        if score >= self.shed_reject_at:
+            self.load_shed_counter.labels("rejected").inc()
+            raise self.admission.reject("upstream_saturated")
+        if score >= self.shed_downgrade_at:
+            self.load_shed_counter.labels("downgraded").inc()
+            limit = min(max_tokens or self.vllm_max_tokens, self.shed_downgrade_max_tokens)
+            return limit, True
+        return max_tokens, False
+
+    def _discard_session_turn(self, session_id: str, query: str) -> None:
+        # Undo the user turn of a rejected request so a retry does not repeat it.
+        history = self.sessions.get(session_id)
+        if history and history[-1] == {"role": "user", "content": query}:
+            history.pop()
+
+    def _overloaded_response(self, exc: AdmissionRejected) -> JSONResponse:
+        retry_after = max(1, math.ceil(exc.retry_after_seconds))
+        self.logger.warning(
+            "admission_rejected",
+            extra={
+                "reason": exc.reason,
+                "in_flight": self.admission.in_flight,
+                "queue_depth": self.admission.queue_depth,
+            },
+        )
+        return JSONResponse(
+            {"error": "overloaded", "reason": exc.reason, "retry_after_seconds": retry_after},
+            status_code=429,
+            headers={"Retry-After": str(retry_after)},
+        )
+
     async def healthz(self) -> dict[str, str]:
         self.request_counter.labels("healthz").inc()
         return {"status": "ok"}
@@ -934,122 +1385,333 @@ class RagApp:
             "timings": self.timings.summarize(),
         }
 
+    async def _spool_uploads(self, files: list[Any] | None) -> list[SpooledUpload]:
+        return [
+            await self._run_ingest_stage(SpooledUpload.copy_of, upload, self.upload_spool_bytes)
+            for upload in files or []
+        ]
+
+    async def submit_ingest(
+        self,
+        files: list[Any] | None,
+        payload: dict[str, Any] | None,
+    ) -> IngestJob:
+        """Queue an ingest to run in the background; raises IngestQueueFull."""
+        # Starlette closes the request's upload files once the response is
+        # sent, so the job gets its own spooled copies.
+        uploads = await self._spool_uploads(files)
+
+        async def run(job: IngestJob) -> dict[str, Any]:
+            try:
+                return await self.ingest(uploads, payload, job=job)
+            finally:
+                for upload in uploads:
+                    upload.close()
+
+        try:
+            job = self.ingest_jobs.submit(run)
+        except IngestQueueFull:
+            for upload in uploads:
+                upload.close()
+            self.ingest_jobs_counter.labels("rejected").inc()
+            raise
+        self.ingest_jobs_counter.labels("submitted").inc()
+        self.logger.info("ingest_job_submitted", extra={"job_id": job.id})
+        return job
+
+    async def _yield_to_queries(self) -> None:
+        # Background ingest waits while queries are queued for admission, or
+        # while more than RAG_INGEST_PAUSE_IN_FLIGHT queries are in flight,
+        # for at most RAG_INGEST_MAX_PAUSE_SECONDS per batch.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.ingest_max_pause_seconds
+        paused = False
+        while loop.time() < deadline and (
+            self.admission.queue_depth > 0
+            or 0 < self.ingest_pause_in_flight <= self.admission.in_flight
+        ):
+            paused = True
+            await asyncio.sleep(0.05)
+        if paused:
+            self.ingest_paused_counter.inc()
+
     async def ingest(
         self,
         files: list[Any] | None,
         payload: dict[str, Any] | None,
+        job: IngestJob | None = None,
     ) -> dict[str, Any]:
         self.request_counter.labels("ingest").inc()
         payload = payload or {}
-        documents: list[Document] = []
-        errors: list[str] = []
+        errors = job.errors if job else ErrorLog()
 
         start_time = time.perf_counter()
+        stats = job.stats if job else IngestStats(on_record=self._observe_ingest_stage)
+        # Each batch is searchable as soon as it is written, so cached answers
+        # are invalidated per batch rather than once at the end.
+        writer = DocumentBatchWriter(
+            self.retrieval,
+            self.ingest_batch_size,
+            stats,
+            on_written=lambda _batch: self._on_store_changed(),
+            before_batch=self._yield_to_queries if job else None,
+        )
+
+        async def extract(loader: Callable[..., str], *args: Any) -> str:
+            started = time.perf_counter()
+            content = await self._run_ingest_stage(loader, *args)
+            stats.record("extract", 1, time.perf_counter() - started)
+            return content
+
+        model_id = self.retrieval.embedding_model if self.retrieval.use_embeddings else None
+        stored_by_key: dict[str, dict[str, str | None]] = {}
+        pending_deletes: dict[str, set[str]] = {}
+        # Saved only once the page's chunks are written; validators for
+        # content that never reached the store would hide it from refresh.
+        pending_validators: dict[str, dict[str, Any]] = {}
+
+        async def stored_for(key: str, index_key: str | None = None) -> dict[str, str | None]:
+            # ingest_index lists the chunks this replica wrote under a key, so
+            # a local in-memory store is not scanned once per key.
+            if key not in stored_by_key:
+                known = list(self.ingest_index.get(index_key or key, ()))
+                stored_by_key[key] = await self.retrieval.documents_for_key(key, known)
+            return stored_by_key[key]
+
+        async def add_document(doc: Document, stored: dict[str, str | None]) -> None:
+            if doc.id in stored and stored[doc.id] == model_id:
+                # Same content under the same key, embedded by the same model.
+                stats.count("skipped")
+                self.ingest_dedup_counter.labels("skipped").inc()
+                return
+            if doc.id in stored:
+                stats.count("re_embedded")
+                self.ingest_dedup_counter.labels("re_embedded").inc()
+            stored[doc.id] = model_id
+            await writer.add(doc)
+
+        async def text_chunks(content: str) -> AsyncIterator[str]:
+            for chunk in iter_chunks(content):
+                yield chunk
+
+        async def upload_chunks(parts: AsyncIterator[str]) -> AsyncIterator[str]:
+            # Parts (page, paragraph or byte ranges) are extracted in the
+            # extraction pool and chunked as they arrive in order, so neither
+            # the file nor its full text is ever held in memory.
+            chunker = StreamChunker()
+            elapsed = 0.0
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        text = await parts.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        elapsed += time.perf_counter() - started
+                    for chunk in chunker.feed(text):
+                        yield chunk
+            finally:
+                stats.record("extract", 1, elapsed)
+            yield chunker.finish()
+
+        async def discard_new_chunks(key: str, new_ids: set[str], indexed: set[str]) -> None:
+            # A source that fails partway through leaves the store and the
+            # index as they were before it; chunks it shares with the stored
+            # version are unchanged either way.
+            written = new_ids - writer.discard(new_ids)
+            if written:
+                await self.retrieval.delete_documents(list(written))
+                writer.written -= len(written)
+                self._on_store_changed()
+            stored = stored_by_key.get(key, {})
+            for doc_id in new_ids:
+                stored.pop(doc_id, None)
+            pending_validators.pop(key, None)
+            if indexed:
+                self.ingest_index[key] = indexed
+            else:
+                self.ingest_index.pop(key, None)
+
+        async def add_chunks(chunks: AsyncIterator[str], meta: dict[str, Any], key: str) -> None:
+            # Re-ingesting a key applies the diff: unchanged chunks are kept
+            # as they are, new ones are embedded and vanished ones deleted.
+            stored = await stored_for(key)
+            previous = set(stored)
+            indexed = set(self.ingest_index.get(key, ()))
+            seen: set[str] = set()
+            count = 0
+            elapsed = 0.0
+            try:
+                async for chunk in chunks:
+                    started = time.perf_counter()
+                    doc = self._make_document(chunk, meta, key=key)
+                    elapsed += time.perf_counter() - started
+                    count += 1
+                    if doc.id in seen:
+                        continue
+                    seen.add(doc.id)
+                    pending_deletes.get(key, set()).discard(doc.id)
+                    self._track_documents(key, [doc])
+                    await add_document(doc, stored)
+            except ExtractionError:
+                await discard_new_chunks(key, seen - previous, indexed)
+                raise
+            finally:
+                stats.record("chunk", count, elapsed)
+            vanished = previous - seen
+            if vanished:
+                # Deleted only once the replacement chunks are written, so a
+                # failed embed or write leaves the old version searchable.
+                pending_deletes.setdefault(key, set()).update(vanished)
+
+        async def apply_deletes() -> None:
+            for key, vanished in pending_deletes.items():
+                if not vanished:
+                    continue
+                await self.retrieval.delete_documents(list(vanished))
+                self.ingest_index[key].difference_update(vanished)
+                stored = stored_by_key.get(key, {})
+                for doc_id in vanished:
+                    stored.pop(doc_id, None)
+                stats.count("deleted", len(vanished))
+                self.ingest_dedup_counter.labels("deleted").inc(len(vanished))
+                self._on_store_changed()
+            pending_deletes.clear()
 
         if files:
+            accepted = []
             for upload in files:
+                size = await self._run_ingest_stage(upload_size, upload)
+                if self.max_upload_bytes and size > self.max_upload_bytes:
+                    errors.append(
+                        f"{upload.filename}: {size} bytes exceeds the "
+                        f"{self.max_upload_bytes} byte upload limit"
+                    )
+                else:
+                    accepted.append(upload)
+            # Files are extracted in parallel but ingested in request order.
+            async for upload, parts in self.extraction.extract(accepted):
+                file_key = upload.filename or f"upload-{uuid4()}"
                 try:
-                    content = load_text_from_upload(upload)
-                    file_key = upload.filename or f"upload-{uuid4()}"
-                    file_docs: list[Document] = []
-                    for chunk in chunk_text(content):
-                        file_docs.append(
-                            self._make_document(
-                                chunk,
-                                {"filename": upload.filename, "source": "file"},
-                                key=file_key,
-                            )
-                        )
-                    documents.extend(file_docs)
-                    self._track_documents(file_key, file_docs)
-                except Exception as exc:  # noqa: BLE001
+                    await add_chunks(
+                        upload_chunks(parts),
+                        {"filename": upload.filename, "source": "file"},
+                        file_key,
+                    )
+                except ExtractionError as exc:
                     errors.append(str(exc))
 
         for item in payload.get("documents", []):
             meta = dict(item.get("meta", {}))
             doc_key = meta.get("filename") or meta.get("ingest_key")
             doc = self._make_document(item.get("content", ""), meta, key=doc_key)
-            documents.append(doc)
+            # The ID hashes meta["ingest_key"], which wins over the filename
+            # the document is tracked (and deletable) under.
+            stored_key = doc.meta.get("ingest_key")
+            stored = await stored_for(stored_key, doc_key) if stored_key else {}
             if doc_key:
                 self._track_documents(doc_key, [doc])
+            # Single documents can share a key across requests, so they are
+            # deduplicated but never trigger deletes.
+            await add_document(doc, stored)
+
+        for text in payload.get("texts", []):
+            # Keyed by content so that separate requests never replace each other.
+            text_key = f"text:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+            await add_chunks(text_chunks(text), {"source": "text"}, text_key)
+
+        # Pages whose validators show no change skip extraction, chunking and
+        # embedding; "force": true re-fetches everything unconditionally.
+        force = bool(payload.get("force"))
+        refresh = {
+            "pages_checked": 0,
+            "not_modified": 0,
+            "unchanged": 0,
+            "changed": 0,
+            "bytes_not_downloaded": 0,
+            "chunks_not_embedded": 0,
+        }
 
-        for index, text in enumerate(payload.get("texts", [])):
-            text_key = f"text:{index}"
-            text_docs: list[Document] = []
-            for chunk in chunk_text(text):
-                text_docs.append(
-                    self._make_document(chunk, {"source": "text"}, key=text_key)
-                )
-            documents.extend(text_docs)
-            self._track_documents(text_key, text_docs)
+        async def add_pages(pages: AsyncIterator[CrawlResult], source: str, prefix: str) -> None:
+            async for page in pages:
+                if page.error is not None:
+                    errors.append(f"{page.url}: {page.error}")
+                    continue
+                key = f"{prefix}{page.url}"
+                previous = self.url_validators.get(key, {})
+                refresh["pages_checked"] += 1
+                if page.not_modified or (
+                    not force and previous.get("content_hash") == page.validators["content_hash"]
+                ):
+                    outcome = "not_modified" if page.not_modified else "unchanged"
+                    refresh[outcome] += 1
+                    self.url_refresh_counter.labels(outcome).inc()
+                    if page.not_modified:
+                        refresh["bytes_not_downloaded"] += previous.get("bytes", 0)
+                    else:
+                        pending_validators[key] = page.validators
+                    refresh["chunks_not_embedded"] += len(self.ingest_index.get(key, ()))
+                    continue
+                try:
+                    content = await extract(extract_text_from_page, page.text, page.content_type)
+                except Exception as exc:  # noqa: BLE001
+                    errors.append(f"{page.url}: {exc}")
+                    continue
+                await add_chunks(text_chunks(content), {"source": source, "url": page.url}, key)
+                pending_validators[key] = page.validators
+                refresh["changed"] += 1
+                self.url_refresh_counter.labels("changed").inc()
 
-        for url in payload.get("urls", []):
-            try:
-                content = load_text_from_url(url)
-                url_docs: list[Document] = []
-                for chunk in chunk_text(content):
-                    url_docs.append(
-                        self._make_document(
-                            chunk,
-                            {"source": "url", "url": url},
-                            key=url,
-                        )
-                    )
-                documents.extend(url_docs)
-                self._track_documents(url, url_docs)
-            except Exception as exc:  # noqa: BLE001
-                errors.append(f"{url}: {exc}")
+        def validators_for(prefix: str) -> Callable[[str], dict[str, Any] | None]:
+            return lambda url: None if force else self.url_validators.get(f"{prefix}{url}")
+
+        urls = payload.get("urls", [])
+        if urls:
+            await add_pages(self.crawler.crawl(urls, validators_for("")), "url", "")
 
         sitemap_url = payload.get("sitemap_url")
         if sitemap_url:
+            locs = self.crawler.iter_sitemap(
+                sitemap_url, on_error=lambda url, error: errors.append(f"sitemap {url}: {error}")
+            )
             try:
-                response = requests.get(sitemap_url, timeout=10)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, "xml")
-                for loc in soup.find_all("loc"):
-                    url = loc.text.strip()
-                    if not url:
-                        continue
-                    try:
-                        content = load_text_from_url(url)
-                        sitemap_docs: list[Document] = []
-                        for chunk in chunk_text(content):
-                            sitemap_docs.append(
-                                self._make_document(
-                                    chunk,
-                                    {"source": "sitemap", "url": url},
-                                    key=f"sitemap:{url}",
-                                )
-                            )
-                        documents.extend(sitemap_docs)
-                        self._track_documents(f"sitemap:{url}", sitemap_docs)
-                    except Exception as exc:  # noqa: BLE001
-                        errors.append(f"{url}: {exc}")
+                await add_pages(
+                    self.crawler.crawl(locs, validators_for("sitemap:")), "sitemap", "sitemap:"
+                )
             except Exception as exc:  # noqa: BLE001
                 errors.append(f"sitemap: {exc}")
 
-        if not documents:
-            return {"ingested": 0, "errors": errors}
-
-        if self.use_embeddings and self.document_embedder:
-            self._ensure_document_embedder_ready()
-            documents = self.document_embedder.run(documents=documents)["documents"]
+        await writer.flush()
+        await apply_deletes()
+        self.url_validators.update(pending_validators)
+        summary = {
+            "ingested": writer.written,
+            "errors": errors.to_list(),
+            "error_count": len(errors),
+            **stats.dedup,
+        }
+        if refresh["pages_checked"]:
+            summary["refresh"] = refresh
+        if not writer.written:
+            return summary
 
-        self.document_store.write_documents(documents)
         duration = time.perf_counter() - start_time
         self.latency_histogram.labels("ingest").observe(duration)
         self.timings.record("ingest", duration)
         self.logger.info(
             "ingested_documents",
-            extra={"count": len(documents), "errors": len(errors)},
+            extra={
+                "count": writer.written,
+                "errors": len(errors),
+                "throughput": stats.throughput(),
+                **stats.dedup,
+            },
         )
-        return {"ingested": len(documents), "errors": errors}
+        return {**summary, "throughput": stats.throughput()}
 
     async def delete(self, payload: dict[str, Any]) -> dict[str, Any]:
         self.request_counter.labels("delete").inc()
-        if not hasattr(self.document_store, "delete_documents"):
-            return {"deleted": 0, "error": "delete is not supported by document store"}
-
         delete_all = bool(payload.get("all"))
         filenames = payload.get("filenames", [])
         keys = payload.get("keys", [])
@@ -1063,17 +1725,26 @@ class RagApp:
 
         try:
             if delete_all:
-                self.document_store.delete_documents()
+                await self.retrieval.delete_documents()
                 self.ingest_index.clear()
+                self.url_validators.clear()
+                self._on_store_changed()
                 return {"deleted": "all"}
             if not ids:
                 return {"deleted": 0, "error": "no matching documents"}
-            self.document_store.delete_documents(list(ids))
+            await self.retrieval.delete_documents(list(ids))
+            self._on_store_changed()
+            # A URL with deleted chunks must be fetched in full next time.
+            for key, key_ids in self.ingest_index.items():
+                if key_ids & ids:
+                    self.url_validators.pop(key, None)
             for name in filenames:
                 self.ingest_index.pop(name, None)
             for key in keys:
                 self.ingest_index.pop(key, None)
             return {"deleted": len(ids)}
+        except NotImplementedError as exc:
+            return {"deleted": 0, "error": str(exc)}
         except Exception as exc:  # noqa: BLE001
             self.error_counter.labels("delete").inc()
             return {"deleted": 0, "error": str(exc)}
@@ -1091,38 +1762,80 @@ class RagApp:
         if not query:
             return {"answers": [], "documents": []}
 
+        ticket = await self._admit()
+        try:
+            return await self._run_query(payload, query, ticket.wait_seconds)
+        finally:
+            ticket.release()
+
+    async def _run_query(
+        self, payload: dict[str, Any], query: str, queue_time: float
+    ) -> dict[str, Any]:
         session_id, history = self._get_session_history(payload.get("session_id"))
         if payload.get("history"):
             history = payload["history"]
 
         self._update_session(session_id, "user", query)
 
+        store_version = self.store_version
         retrieval_start = time.perf_counter()
-        if self.use_embeddings and self.query_embedder:
-            self._ensure_query_embedder_ready()
-            embedding = self.query_embedder.run(text=query)["embedding"]
-            result = self.retriever.run(query_embedding=embedding, top_k=self.top_k)
+        embedding = await self._query_embedding(query)
+        semantic_embedding = self._semantic_cache_embedding(
+            payload, query, history, embedding, None
+        )
+        cached = self._semantic_cache_get(semantic_embedding)
+        if cached:
+            documents = cached["documents"]
         else:
-            result = self.retriever.run(query=query, top_k=self.top_k)
-        documents = result.get("documents", [])
+            documents = self._order_documents(
+                await self.retrieval.search(query, embedding)
+            )
         retrieval_time = time.perf_counter() - retrieval_start
         k = len(documents)
         self.k_retrieved_histogram.observe(k)
 
         prompt = self._build_prompt(query, history, documents)
+        cache_key = self._answer_cache_key(payload, query, history, documents, None)
+        if cached is None:
+            cached = self._answer_cache_get(cache_key)
+
+        max_tokens: int | None = None
+        downgraded = False
+        if not cached:
+            try:
+                max_tokens, downgraded = await self._shed_load(None)
+            except AdmissionRejected:
+                self._discard_session_turn(session_id, query)
+                raise
+            if downgraded:
+                # A shortened answer must not be cached under the full-length key.
+                cache_key, semantic_embedding = None, None
 
         generation_start = time.perf_counter()
         ttft_start = time.perf_counter()
         answer = ""
-        try:
-            answer = await self.vllm.complete_chat(prompt)
-        except Exception as exc:  # noqa: BLE001
-            self.error_counter.labels("query").inc()
-            answer = f"Generation failed: {exc}"
+        usage: dict[str, int] = {}
+        if cached:
+            answer = cached["answer"]
+            usage = dict(cached.get("usage") or {})
+        else:
+            try:
+                answer = await self.vllm.complete_chat(prompt, max_tokens, usage=usage)
+                self._cache_answer(
+                    cache_key, semantic_embedding, answer, usage, documents, store_version
+                )
+            except Exception as exc:  # noqa: BLE001
+                self.error_counter.labels("query").inc()
+                answer = f"Generation failed: {exc}"
         generation_time = time.perf_counter() - generation_start
         ttft = time.perf_counter() - ttft_start
-        # Token estimation uses whitespace splits to avoid tokenizer overhead.
-        token_count = max(1, len(answer.split())) if answer else 0
+        prompt_tokens = usage.get("prompt_tokens")
+        token_count = usage.get("completion_tokens")
+        token_count_source = "usage"
+        if token_count is None:
+            # Whitespace fallback for servers that do not report usage.
+            token_count = max(1, len(answer.split())) if answer else 0
+            token_count_source = "estimated"
         tokens_per_second = token_count / generation_time if generation_time > 0 else 0.0
 
         self._update_session(session_id, "assistant", answer)
@@ -1132,11 +1845,13 @@ class RagApp:
         self.latency_histogram.labels("retrieval").observe(retrieval_time)
         self.latency_histogram.labels("generation").observe(generation_time)
         self.ttft_histogram.observe(ttft)
-        if token_count:
+        if token_count and not cached:
             self.token_counter.inc(token_count)
             self.tokens_per_second_histogram.observe(tokens_per_second)
+        if prompt_tokens is not None and not cached:
+            self.prompt_tokens_histogram.observe(prompt_tokens)
 
-        total_time = retrieval_time + generation_time
+        total_time = queue_time + retrieval_time + generation_time
         self.latency_histogram.labels("total").observe(total_time)
 
         self.logger.info(
@@ -1145,6 +1860,7 @@ class RagApp:
                 "query": query,
                 "documents": len(documents),
                 "session_id": session_id,
+                "queue_ms": round(queue_time * 1000, 2),
                 "retrieval_ms": round(retrieval_time * 1000, 2),
                 "generation_ms": round(generation_time * 1000, 2),
             },
@@ -1161,17 +1877,25 @@ class RagApp:
                 for doc in documents
             ],
             "timings": {
+                "queue_ms": round(queue_time * 1000, 2),
                 "retrieval_ms": round(retrieval_time * 1000, 2),
                 "generation_ms": round(generation_time * 1000, 2),
                 "total_ms": round(total_time * 1000, 2),
                 "ttft_ms": round(ttft * 1000, 2),
                 "tokens_per_second": round(tokens_per_second, 2),
                 "tokens_estimated": token_count,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": token_count,
+                "token_count_source": token_count_source,
             },
+            "cached": cached is not None,
+            "downgraded": downgraded,
             "history": self.sessions.get(session_id, []),
         }
 
-    async def query_stream(self, payload: dict[str, Any]) -> StreamingResponse:
+    async def query_stream(
+        self, payload: dict[str, Any], request: Request | None = None
+    ) -> StreamingResponse:
         self.request_counter.labels("query_stream").inc()
         query = payload.get("query", "")
         if not query:
@@ -1187,6 +1911,33 @@ class RagApp:
                 media_type="text/event-stream",
             )
 
+        # The slot is held until the stream finishes, not just until the
+        # response object is returned.
+        ticket = await self._admit()
+
+        async def release_slot() -> None:
+            ticket.release()
+
+        try:
+            stream = await self._run_query_stream(payload, query, ticket.wait_seconds, request)
+        except BaseException:
+            ticket.release()
+            raise
+        # The background task covers clients that disconnect before the body
+        # iterator starts; release() is idempotent.
+        return StreamingResponse(
+            ticket.guard(stream),
+            media_type="text/event-stream",
+            background=BackgroundTask(release_slot),
+        )
+
+    async def _run_query_stream(
+        self,
+        payload: dict[str, Any],
+        query: str,
+        queue_time: float,
+        request: Request | None,
+    ) -> AsyncIterator[bytes]:
         request_id = uuid4().hex
         session_id, history = self._get_session_history(payload.get("session_id"))
         if payload.get("history"):
@@ -1202,24 +1953,45 @@ class RagApp:
 
         self._update_session(session_id, "user", query)
 
+        store_version = self.store_version
         retrieval_start = time.perf_counter()
-        if self.use_embeddings and self.query_embedder:
-            self._ensure_query_embedder_ready()
-            embedding = self.query_embedder.run(text=query)["embedding"]
-            result = self.retriever.run(query_embedding=embedding, top_k=self.top_k)
+        embedding = await self._query_embedding(query)
+        semantic_embedding = self._semantic_cache_embedding(
+            payload, query, history, embedding, max_tokens_override
+        )
+        cached = self._semantic_cache_get(semantic_embedding)
+        if cached:
+            documents = cached["documents"]
         else:
-            result = self.retriever.run(query=query, top_k=self.top_k)
-        documents = result.get("documents", [])
+            documents = self._order_documents(
+                await self.retrieval.search(query, embedding)
+            )
         retrieval_time = time.perf_counter() - retrieval_start
         k = len(documents)
         self.k_retrieved_histogram.observe(k)
 
         prompt = self._build_prompt(query, history, documents)
+        cache_key = self._answer_cache_key(
+            payload, query, history, documents, max_tokens_override
+        )
+        if cached is None:
+            cached = self._answer_cache_get(cache_key)
+
+        downgraded = False
+        if not cached:
+            try:
+                max_tokens_override, downgraded = await self._shed_load(max_tokens_override)
+            except AdmissionRejected:
+                self._discard_session_turn(session_id, query)
+                raise
+            if downgraded:
+                cache_key, semantic_embedding = None, None
 
         async def event_stream() -> AsyncIterator[bytes]:
             # SSE event contract:
             # meta -> retrieval docs + timings, ttft -> time to first token,
             # token -> incremental delta, done -> final timings + citations.
+            self.stream_events_counter.labels("meta").inc()
             yield sse(
                 "meta",
                 {
@@ -1237,6 +2009,7 @@ class RagApp:
                         for doc in documents
                     ],
                     "timings": {
+                        "queue_ms": round(queue_time * 1000, 2),
                         "retrieval_ms": round(retrieval_time * 1000, 2),
                     },
                 },
@@ -1244,16 +2017,40 @@ class RagApp:
 
             generation_start = time.perf_counter()
             server_start = generation_start
-            token_count = 0
+            delta_count = 0
+            token_events = 0
+            token_bytes = 0
             server_first_token_at: float | None = None
+            answer_parts: list[str] = []
+            joined = False
+            watcher: DisconnectWatcher | None = None
+            if cached:
+                source = replay_text(cached["answer"])
+                usage = dict(cached.get("usage") or {})
+            else:
+                source, usage, joined = self._generation_stream(
+                    payload, prompt, max_tokens_override
+                )
+                if request is not None and self.disconnect_poll_seconds > 0:
+                    watcher = DisconnectWatcher(
+                        request.is_disconnected, self.disconnect_poll_seconds
+                    )
+            batches = coalesce_deltas(
+                source,
+                self.stream_coalesce_seconds,
+                self.stream_coalesce_tokens,
+            )
 
             try:
-                async for delta in self.vllm.stream_chat(prompt, max_tokens_override):
+                if watcher is not None:
+                    watcher.start()
+                async for deltas in batches:
                     if server_first_token_at is None:
                         server_first_token_at = time.perf_counter()
                         ttft_value = server_first_token_at - server_start
                         self.ttft_histogram.observe(ttft_value)
                         self.timings.record("ttft", ttft_value)
+                        self.stream_events_counter.labels("ttft").inc()
                         yield sse(
                             "ttft",
                             {
@@ -1263,8 +2060,18 @@ class RagApp:
                             },
                         )
 
-                    token_count += 1
-                    yield sse("token", {"text": delta})
+                    delta_count += len(deltas)
+                    text = "".join(deltas)
+                    if not cached and not joined and (
+                        cache_key or semantic_embedding is not None
+                    ):
+                        answer_parts.append(text)
+                    frame = sse("token", {"text": text})
+                    token_events += 1
+                    token_bytes += len(frame)
+                    yield frame
+                if watcher is not None:
+                    watcher.stop()
 
                 generation_time = time.perf_counter() - generation_start
                 total_ms = (time.perf_counter() - server_start) * 1000
@@ -1278,26 +2085,51 @@ class RagApp:
                     if server_first_token_at is not None
                     else None
                 )
+                # vLLM usage is exact; delta counts only approximate tokens.
+                prompt_tokens = usage.get("prompt_tokens")
+                token_count = usage.get("completion_tokens", delta_count)
                 tokens_per_second = (
                     token_count / stream_duration_sec
                     if stream_duration_sec and stream_duration_sec > 0
                     else None
                 )
 
-                self.token_counter.inc(token_count)
+                if cached:
+                    tokens_per_second = None
+                elif not joined:
+                    self._cache_answer(
+                        cache_key,
+                        semantic_embedding,
+                        "".join(answer_parts),
+                        usage,
+                        documents,
+                        store_version,
+                    )
+                    self.token_counter.inc(token_count)
+                    if prompt_tokens is not None:
+                        self.prompt_tokens_histogram.observe(prompt_tokens)
                 if tokens_per_second is not None:
                     self.tokens_per_second_histogram.observe(tokens_per_second)
+                self.stream_events_counter.labels("token").inc(token_events)
+                self.stream_bytes_counter.inc(token_bytes)
+                if token_count:
+                    self.stream_bytes_per_token_histogram.observe(token_bytes / token_count)
+                if stream_duration_sec and stream_duration_sec > 0:
+                    self.stream_events_per_second_histogram.observe(
+                        token_events / stream_duration_sec
+                    )
                 # TPOT = time per output token (excluding first token)
-                if stream_duration_sec and token_count > 1:
+                if stream_duration_sec and token_count > 1 and not cached:
                     tpot = stream_duration_sec / (token_count - 1)
                     self.tpot_histogram.observe(tpot)
                 self.timings.record("retrieval", retrieval_time)
                 self.timings.record("generation", generation_time)
                 self.latency_histogram.labels("retrieval").observe(retrieval_time)
                 self.latency_histogram.labels("generation").observe(generation_time)
-                total_time = retrieval_time + generation_time
+                total_time = queue_time + retrieval_time + generation_time
                 self.latency_histogram.labels("total").observe(total_time)
 
+                self.stream_events_counter.labels("done").inc()
                 yield sse(
                     "done",
                     {
@@ -1319,13 +2151,38 @@ class RagApp:
                             "total_ms": round(total_ms, 2),
                         },
                         "token_count": token_count,
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": token_count,
+                        "token_count_source": "usage"
+                        if "completion_tokens" in usage
+                        else "deltas",
                         "tokens_per_sec": round(tokens_per_second, 2)
                         if tokens_per_second is not None
                         else None,
+                        "cached": cached is not None,
+                        "shared": joined,
+                        "downgraded": downgraded,
                     },
                 )
+            except (asyncio.CancelledError, GeneratorExit) as exc:
+                # The disconnect watcher, Serve or the server closing the body
+                # iterator ended the stream; the upstream is closed below.
+                disconnected = watcher is not None and watcher.disconnected
+                self._record_cancelled_stream(
+                    "disconnect" if disconnected else "cancelled",
+                    request_id,
+                    delta_count,
+                    max_tokens_override,
+                    cached,
+                    joined,
+                )
+                if not (disconnected and isinstance(exc, asyncio.CancelledError)):
+                    raise
+                # Cancelled by the watcher alone: end the stream quietly.
+                asyncio.current_task().uncancel()
             except Exception as exc:  # noqa: BLE001
                 self.error_counter.labels("query_stream").inc()
+                self.stream_events_counter.labels("error").inc()
                 yield sse(
                     "error",
                     {
@@ -1334,15 +2191,55 @@ class RagApp:
                         "request_id": request_id,
                     },
                 )
+            finally:
+                if watcher is not None:
+                    watcher.stop()
+                # Close the upstream now rather than when the generator is
+                # garbage collected, so vLLM stops decoding immediately.
+                await batches.aclose()
+
+        return event_stream()
+
+    def _record_cancelled_stream(
+        self,
+        reason: str,
+        request_id: str,
+        delta_count: int,
+        max_tokens: int | None,
+        cached: dict[str, Any] | None,
+        joined: bool,
+    ) -> None:
+        self.cancelled_streams_counter.labels(reason).inc()
+        tokens_saved = 0
+        if not cached and not joined:
+            # Joined streams leave the shared generation to other subscribers.
+            tokens_saved = max(0, (max_tokens or self.vllm_max_tokens) - delta_count)
+        self.cancelled_tokens_saved_counter.inc(tokens_saved)
+        self.logger.info(
+            "query_stream_cancelled",
+            extra={
+                "request_id": request_id,
+                "reason": reason,
+                "tokens_streamed": delta_count,
+                "tokens_saved": tokens_saved,
+            },
+        )
 
-        return StreamingResponse(event_stream(), media_type="text/event-stream")
+    def _order_documents(self, documents: list[Document]) -> list[Document]:
+        # The prefix layout needs the same retrieved set to render to the same
+        # bytes regardless of score ties, so order by document ID.
+        if self.prompt_layout != "prefix":
+            return documents
+        return sorted(documents, key=lambda doc: doc.id or "")
 
     def _build_prompt(
         self,
         query: str,
         history: list[dict[str, str]],
         documents: list[Document],
-    ) -> str:
+    ) -> Prompt:
+        if self.prompt_layout == "prefix":
+            return self._build_prefix_messages(query, history, documents)
         prompt_context = "\n\n".join(
             f"[{index + 1}] {doc.content}" for index, doc in enumerate(documents)
         )
@@ -1357,6 +2254,37 @@ class RagApp:
             f"Question: {query}\nAnswer:"
         )
 
+    def _build_prefix_messages(
+        self,
+        query: str,
+        history: list[dict[str, str]],
+        documents: list[Document],
+    ) -> list[dict[str, str]]:
+        """Chat messages ordered most-shared first for vLLM prefix caching.
+
+        Stable instructions, then the context block, then conversation turns,
+        then the question. Consecutive same-role turns are merged so strict
+        chat templates accept the sequence.
+        """
+        context = "\n\n".join(
+            f"[{index + 1}] {doc.content}" for index, doc in enumerate(documents)
+        )
+        turns = list(history[-self.max_history :])
+        if turns and turns[-1] == {"role": "user", "content": query}:
+            turns.pop()
+        turns.append({"role": "user", "content": query})
+        messages = [{"role": "system", "content": PREFIX_SYSTEM_PROMPT + context}]
+        for turn in turns:
+            role = "assistant" if turn.get("role") == "assistant" else "user"
+            if messages[-1]["role"] == role:
+                messages[-1] = {
+                    "role": role,
+                    "content": f"{messages[-1]['content']}\n\n{turn.get('content', '')}",
+                }
+            else:
+                messages.append({"role": role, "content": turn.get("content", "")})
+        return messages
+
     def _sse_event(self, name: str, data: dict[str, Any]) -> bytes:
         return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
 
@@ -1368,6 +2296,7 @@ class RagApp:
             yield f"data: {json.dumps(payload)}\n\n".encode()
 
     async def __call__(self, request: Request) -> Response:
+        self._start_background_tasks()
         path = request.url.path
         method = request.method.upper()
 
@@ -1381,6 +2310,13 @@ class RagApp:
             return JSONResponse(await self.stats())
 
         if path == "/ingest" and method == "POST":
+            # Refuse oversized bodies before any of them is read or spooled.
+            content_length = int(request.headers.get("content-length") or 0)
+            if self.max_upload_bytes and content_length > self.max_upload_bytes:
+                return JSONResponse(
+                    {"error": "upload_too_large", "max_bytes": self.max_upload_bytes},
+                    status_code=413,
+                )
             content_type = request.headers.get("content-type", "")
             files = None
             payload = None
@@ -1392,7 +2328,30 @@ class RagApp:
                     payload = await request.json()
                 except ValueError:
                     payload = None
-            return JSONResponse(await self.ingest(files=files, payload=payload))
+            if request.query_params.get("wait", "").lower() in {"1", "true", "yes"}:
+                # Spooled like job uploads, so large files have a path the
+                # extraction workers can open.
+                uploads = await self._spool_uploads(files)
+                try:
+                    return JSONResponse(await self.ingest(files=uploads, payload=payload))
+                finally:
+                    for upload in uploads:
+                        upload.close()
+            try:
+                job = await self.submit_ingest(files, payload)
+            except IngestQueueFull:
+                return JSONResponse(
+                    {"error": "ingest_queue_full"},
+                    status_code=429,
+                    headers={"Retry-After": "5"},
+                )
+            return JSONResponse(job.to_dict(), status_code=202)
+
+        if path.startswith("/ingest/jobs/") and method == "GET":
+            job = self.ingest_jobs.get(path.removeprefix("/ingest/jobs/"))
+            if job is None:
+                return JSONResponse({"error": "job_not_found"}, status_code=404)
+            return JSONResponse(job.to_dict())
 
         if path == "/delete" and method == "POST":
             payload = await request.json()
@@ -1443,13 +2402,42 @@ class RagApp:
 
         if path == "/query" and method == "POST":
             payload = await request.json()
-            return JSONResponse(await self.query(payload))
+            try:
+                return JSONResponse(await self.query(payload))
+            except AdmissionRejected as exc:
+                return self._overloaded_response(exc)
 
         if path == "/query/stream" and method == "POST":
             payload = await request.json()
-            return await self.query_stream(payload)
+            try:
+                return await self.query_stream(payload, request)
+            except AdmissionRejected as exc:
+                return self._overloaded_response(exc)
 
         return JSONResponse({"error": "not_found"}, status_code=404)
 
 
-deployment = RagApp.bind()
+def build_deployment() -> Any:
+    """Bind the application.
+
+    RAG_EMBEDDING_DEPLOYMENT moves the embedding models into their own
+    deployment. RAG_DEPLOYMENT_GRAPH splits retrieval and generation out of
+    the ingress so each stage scales on its own.
+    """
+    ingress = RagApp.options(**deployment_options("RAG_INGRESS", **ingress_scaling_defaults()))
+    embedding = None
+    if env_flag("RAG_EMBEDDING_DEPLOYMENT"):
+        embedding = EmbeddingService.options(**deployment_options("RAG_EMBEDDING")).bind()
+    if env_flag("RAG_DEPLOYMENT_GRAPH"):
+        return ingress.bind(
+            retrieval_service=RetrievalService.options(
+                **deployment_options("RAG_RETRIEVAL")
+            ).bind(embedding),
+            generation_service=GenerationService.options(
+                **deployment_options("RAG_GENERATION")
+            ).bind(),
+        )
+    return ingress.bind(embedding)
+
+
+deployment = build_deployment()
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from haystack import Document
+from haystack.components.embedders import (
+    SentenceTransformersDocumentEmbedder,
+    SentenceTransformersTextEmbedder,
+)
+from haystack.components.retrievers.in_memory import (
+    InMemoryBM25Retriever,
+    InMemoryEmbeddingRetriever,
+)
+from haystack.document_stores.in_memory import InMemoryDocumentStore
+from haystack.document_stores.types import DuplicatePolicy
+from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+from haystack_integrations.components.retrievers.qdrant import QdrantEmbeddingRetriever
+
+from app.config import env_flag
+from app.embedding_batcher import EmbeddingBatcher
+from app.embedding_service import embed_query_batch
+
+T = TypeVar("T")
+
+logger = logging.getLogger("rag-app")
+
+
+def embeddings_enabled() -> bool:
+    # Qdrant is only used through embedding retrieval.
+    return env_flag("RAG_USE_EMBEDDINGS", "true") or bool(os.getenv("QDRANT_URL", ""))
+
+
+class RetrievalStage:
+    """Query embedding plus document store search and writes.
+
+    Runs in-process in RagApp, or inside RetrievalService in the deployment
+    graph. Blocking model and store calls go to the given executors so the
+    caller's event loop only does I/O. Embedding is delegated to an
+    EmbeddingService handle when one is given.
+    """
+
+    def __init__(
+        self,
+        query_executor: Executor,
+        ingest_executor: Executor,
+        embedding_service: Any | None = None,
+        on_batch: Callable[[int, list[float]], None] | None = None,
+    ) -> None:
+        self.use_embeddings = embeddings_enabled()
+        self.qdrant_url = os.getenv("QDRANT_URL", "")
+        self.qdrant_collection = os.getenv("QDRANT_COLLECTION", "rag-documents")
+        self.embedding_model = os.getenv(
+            "EMBEDDING_MODEL_ID",
+            "sentence-transformers/all-MiniLM-L6-v2",
+        )
+        self.embedding_dim = int(os.getenv("EMBEDDING_DIM", "384"))
+        self.top_k = int(os.getenv("RAG_TOP_K", "4"))
+        self.query_executor = query_executor
+        self.ingest_executor = ingest_executor
+        self.embedding_service = embedding_service
+        self.document_store = self._build_document_store()
+        self.retriever = self._build_retriever()
+        # With a separate embedding deployment this process loads no models.
+        self.document_embedder = self._build_document_embedder()
+        self.query_embedder = self._build_query_embedder()
+        self.query_batcher = self._build_query_batcher(on_batch)
+        self._embedder_lock = threading.Lock()
+        self._embedder_ready = {"document": False, "query": False}
+        self._warm_up_embedders()
+
+    async def _run(self, executor: Executor, func: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args))
+
+    def _warm_up_embedders(self) -> None:
+        for name, embedder in (
+            ("document", self.document_embedder),
+            ("query", self.query_embedder),
+        ):
+            if embedder is None:
+                continue
+            warm_up = getattr(embedder, "warm_up", None)
+            if callable(warm_up):
+                try:
+                    warm_up()
+                    self._embedder_ready[name] = True
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning(
+                        "embedder_warmup_failed",
+                        extra={"embedder": name, "error": str(exc)},
+                    )
+                    raise
+
+    def _ensure_query_embedder_ready(self) -> None:
+        if not self.query_embedder:
+            return
+        if self._embedder_ready.get("query"):
+            return
+        with self._embedder_lock:
+            if self._embedder_ready.get("query"):
+                return
+            warm_up = getattr(self.query_embedder, "warm_up", None)
+            if callable(warm_up):
+                try:
+                    warm_up()
+                except Exception:  # noqa: BLE001
+                    raise
+            self._embedder_ready["query"] = True
+
+    def _ensure_document_embedder_ready(self) -> None:
+        if not self.document_embedder:
+            return
+        if self._embedder_ready.get("document"):
+            return
+        with self._embedder_lock:
+            if self._embedder_ready.get("document"):
+                return
+            warm_up = getattr(self.document_embedder, "warm_up", None)
+            if callable(warm_up):
+                try:
+                    warm_up()
+                except Exception:  # noqa: BLE001
+                    raise
+            self._embedder_ready["document"] = True
+
+    def _build_document_store(self) -> Any:
+        if self.qdrant_url:
+            return QdrantDocumentStore(
+                url=self.qdrant_url,
+                index=self.qdrant_collection,
+                embedding_dim=self.embedding_dim,
+            )
+        return InMemoryDocumentStore()
+
+    def _build_retriever(self) -> Any:
+        if self.use_embeddings:
+            if self.qdrant_url:
+                return QdrantEmbeddingRetriever(document_store=self.document_store)
+            return InMemoryEmbeddingRetriever(document_store=self.document_store)
+        if isinstance(self.document_store, InMemoryDocumentStore):
+            return InMemoryBM25Retriever(document_store=self.document_store)
+        raise ValueError("BM25 retriever is only supported with in-memory store.")
+
+    def _build_document_embedder(self) -> Any | None:
+        if not self.use_embeddings or self.embedding_service is not None:
+            return None
+        return SentenceTransformersDocumentEmbedder(model=self.embedding_model)
+
+    def _build_query_embedder(self) -> Any | None:
+        if not self.use_embeddings or self.embedding_service is not None:
+            return None
+        return SentenceTransformersTextEmbedder(model=self.embedding_model)
+
+    def _build_query_batcher(
+        self, on_batch: Callable[[int, list[float]], None] | None
+    ) -> EmbeddingBatcher | None:
+        max_batch_size = int(os.getenv("RAG_EMBED_BATCH_MAX_SIZE", "16"))
+        if self.query_embedder is None or max_batch_size <= 1:
+            return None
+        return EmbeddingBatcher(
+            self._embed_queries,
+            self.query_executor,
+            max_batch_size=max_batch_size,
+            max_wait_seconds=float(os.getenv("RAG_EMBED_BATCH_MAX_WAIT_MS", "0")) / 1000,
+            on_batch=on_batch,
+        )
+
+    def _embed_query(self, query: str) -> Any:
+        self._ensure_query_embedder_ready()
+        return self.query_embedder.run(text=query)["embedding"]
+
+    def _embed_queries(self, texts: list[str]) -> list[list[float]]:
+        self._ensure_query_embedder_ready()
+        return embed_query_batch(self.query_embedder, texts)
+
+    def _embed_documents(self, documents: list[Document]) -> list[Document]:
+        self._ensure_document_embedder_ready()
+        return self.document_embedder.run(documents=documents)["documents"]
+
+    def _retrieve_documents(self, query: str, embedding: Any | None) -> list[Document]:
+        if embedding is not None:
+            result = self.retriever.run(query_embedding=embedding, top_k=self.top_k)
+        else:
+            result = self.retriever.run(query=query, top_k=self.top_k)
+        return result.get("documents", [])
+
+    async def embed_query(self, query: str) -> Any | None:
+        if not self.use_embeddings:
+            return None
+        if self.embedding_service is not None:
+            return await self.embedding_service.embed_query.remote(query)
+        if self.query_batcher is not None:
+            return await self.query_batcher.embed(query)
+        return await self._run(self.query_executor, self._embed_query, query)
+
+    async def search(self, query: str, embedding: Any | None) -> list[Document]:
+        return await self._run(self.query_executor, self._retrieve_documents, query, embedding)
+
+    async def embed_documents(self, documents: list[Document]) -> list[Document]:
+        if not self.use_embeddings:
+            return documents
+        if self.embedding_service is None:
+            documents = await self._run(self.ingest_executor, self._embed_documents, documents)
+            return self._tag_model(documents)
+        embeddings = await self.embedding_service.embed_documents.remote(
+            [document.content or "" for document in documents]
+        )
+        for document, embedding in zip(documents, embeddings):
+            document.embedding = embedding
+        return self._tag_model(documents)
+
+    def _tag_model(self, documents: list[Document]) -> list[Document]:
+        # Lets re-ingest tell whether a stored chunk needs a new embedding.
+        for document in documents:
+            document.meta["embedding_model"] = self.embedding_model
+        return documents
+
+    async def write_documents(self, documents: list[Document]) -> int:
+        """Write already embedded documents; returns the count written."""
+        # IDs are content hashes, so a re-embedded chunk replaces its old copy.
+        await self._run(
+            self.ingest_executor,
+            partial(self.document_store.write_documents, policy=DuplicatePolicy.OVERWRITE),
+            documents,
+        )
+        return len(documents)
+
+    def _documents_for_key(self, key: str, known_ids: list[str] | None) -> dict[str, str | None]:
+        if known_ids is not None and isinstance(self.document_store, InMemoryDocumentStore):
+            storage = self.document_store.storage
+            documents = [
+                storage[doc_id]
+                for doc_id in known_ids
+                if doc_id in storage and storage[doc_id].meta.get("ingest_key") == key
+            ]
+        else:
+            documents = self.document_store.filter_documents(
+                filters={"field": "meta.ingest_key", "operator": "==", "value": key}
+            )
+        return {document.id: document.meta.get("embedding_model") for document in documents}
+
+    async def documents_for_key(
+        self, key: str, known_ids: list[str] | None = None
+    ) -> dict[str, str | None]:
+        """Stored chunk IDs for an ingest key, mapped to their embedding model.
+
+        `known_ids` are the caller's record of the key's chunks. The in-memory
+        store looks those up by ID, since its filter scans every document.
+        """
+        return await self._run(self.ingest_executor, self._documents_for_key, key, known_ids)
+
+    async def delete_documents(self, document_ids: list[str] | None = None) -> None:
+        """Delete the given documents, or every document when ids is None."""
+        if not hasattr(self.document_store, "delete_documents"):
+            raise NotImplementedError("delete is not supported by document store")
+        if document_ids is None:
+            await self._run(self.ingest_executor, self.document_store.delete_documents)
+        else:
+            await self._run(
+                self.ingest_executor, self.document_store.delete_documents, document_ids
+            )
+
+    def close(self) -> None:
+        if self.query_batcher is not None:
+            self.query_batcher.close()
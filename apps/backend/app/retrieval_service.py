@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from haystack import Document
+from ray import serve
+
+from app.retrieval import RetrievalStage, embeddings_enabled
+
+
+@serve.deployment(ray_actor_options={"num_cpus": 1})
+class RetrievalService:
+    """Query embedding and document store search as a separate deployment.
+
+    Lets retrieval replicas sit close to Qdrant and scale apart from the SSE
+    ingress. Replicas share no state, so use Qdrant rather than the
+    in-memory store when running more than one.
+    """
+
+    def __init__(self, embedding_service: Any | None = None) -> None:
+        self.query_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_QUERY_STAGE_WORKERS", "4")),
+            thread_name_prefix="rag-query",
+        )
+        self.ingest_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_INGEST_STAGE_WORKERS", "2")),
+            thread_name_prefix="rag-ingest",
+        )
+        self.stage = RetrievalStage(
+            self.query_executor,
+            self.ingest_executor,
+            embedding_service=(
+                embedding_service.options(use_new_handle_api=True)
+                if embedding_service is not None
+                else None
+            ),
+        )
+
+    async def embed_query(self, query: str) -> Any | None:
+        return await self.stage.embed_query(query)
+
+    async def search(self, query: str, embedding: Any | None) -> list[Document]:
+        return await self.stage.search(query, embedding)
+
+    async def embed_documents(self, documents: list[Document]) -> list[Document]:
+        return await self.stage.embed_documents(documents)
+
+    async def write_documents(self, documents: list[Document]) -> int:
+        return await self.stage.write_documents(documents)
+
+    async def documents_for_key(self, key: str) -> dict[str, str | None]:
+        return await self.stage.documents_for_key(key)
+
+    async def delete_documents(self, document_ids: list[str] | None = None) -> None:
+        await self.stage.delete_documents(document_ids)
+
+    async def __del__(self) -> None:
+        self.stage.close()
+        self.query_executor.shutdown(wait=False, cancel_futures=True)
+        self.ingest_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RemoteRetrieval:
+    """RetrievalStage interface backed by a RetrievalService handle."""
+
+    def __init__(self, handle: Any) -> None:
+        self.handle = handle.options(use_new_handle_api=True)
+        self.use_embeddings = embeddings_enabled()
+        self.embedding_model = os.getenv(
+            "EMBEDDING_MODEL_ID",
+            "sentence-transformers/all-MiniLM-L6-v2",
+        )
+
+    async def embed_query(self, query: str) -> Any | None:
+        return await self.handle.embed_query.remote(query)
+
+    async def search(self, query: str, embedding: Any | None) -> list[Document]:
+        return await self.handle.search.remote(query, embedding)
+
+    async def embed_documents(self, documents: list[Document]) -> list[Document]:
+        if not self.use_embeddings:
+            return documents
+        return await self.handle.embed_documents.remote(documents)
+
+    async def write_documents(self, documents: list[Document]) -> int:
+        return await self.handle.write_documents.remote(documents)
+
+    async def documents_for_key(
+        self, key: str, known_ids: list[str] | None = None
+    ) -> dict[str, str | None]:
+        # An ingress replica only knows the chunks it wrote itself, so the
+        # service always filters the store.
+        return await self.handle.documents_for_key.remote(key)
+
+    async def delete_documents(self, document_ids: list[str] | None = None) -> None:
+        await self.handle.delete_documents.remote(document_ids)
+
+    def close(self) -> None:
+        pass
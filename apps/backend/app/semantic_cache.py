@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Any
+
+import numpy as np
+
+
+class SemanticCache:
+    """Answer cache keyed by query embedding, matched by cosine similarity.
+
+    Entries live in a fixed-size float32 matrix so a lookup is one
+    matrix-vector product over all slots. Expired slots are masked out and
+    reused first; otherwise the entry closest to expiry is replaced.
+    """
+
+    def __init__(self, max_entries: int, threshold: float, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._vectors: np.ndarray | None = None
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._values: list[dict[str, Any] | None] = [None] * max_entries
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: Any) -> np.ndarray | None:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._expires_at > time.monotonic()))
+
+    def lookup(self, embedding: Any) -> tuple[dict[str, Any] | None, float]:
+        """Return the best live entry above threshold and its similarity."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if vector is None or self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                return None, 0.0
+            live = self._expires_at > time.monotonic()
+            if not live.any():
+                return None, 0.0
+            similarities = self._vectors @ vector
+            similarities[~live] = -1.0
+            index = int(np.argmax(similarities))
+            score = float(similarities[index])
+            if score < self.threshold:
+                return None, score
+            return self._values[index], score
+
+    def put(self, embedding: Any, value: dict[str, Any]) -> None:
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        with self._lock:
+            if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                # First entry (or a new embedding model) fixes the dimension.
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._expires_at[:] = 0.0
+                self._values = [None] * self.max_entries
+            index = int(np.argmin(self._expires_at))
+            self._vectors[index] = vector
+            self._expires_at[index] = time.monotonic() + self.ttl_seconds
+            self._values[index] = value
+
+    def clear(self) -> int:
+        with self._lock:
+            count = int(np.count_nonzero(self._expires_at > time.monotonic()))
+            self._expires_at[:] = 0.0
+            self._values = [None] * self.max_entries
+        return count
@@ -4,7 +4,7 @@ import signal
 import ray
 from ray import serve
 
-from app.main import deployment
+from app.main import build_deployment
 
 
 def _parse_int(name: str) -> int | None:
@@ -27,7 +27,7 @@ def main() -> None:
 
     port = _parse_int("PORT") or 8000
     serve.start(http_options={"host": "0.0.0.0", "port": port})
-    serve.run(deployment)
+    serve.run(build_deployment())
     # Keep the process alive for Kubernetes.
     signal.pause()
 
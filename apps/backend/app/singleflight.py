@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncIterator, Callable
+
+
+class SharedStream:
+    """One upstream delta stream fanned out to any number of subscribers.
+
+    Deltas are kept for the lifetime of the stream so late joiners replay the
+    prefix they missed before following live output. The upstream is
+    cancelled once its last subscriber goes away.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[dict[str, int]], AsyncIterator[str]],
+        on_done: Callable[["SharedStream"], None],
+    ) -> None:
+        self.deltas: list[str] = []
+        self.usage: dict[str, int] = {}
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self._on_done = on_done
+        self._changed = asyncio.Event()
+        # The factory receives the shared usage dict so every subscriber can
+        # report vLLM's token counts once the generation finishes.
+        self._task = asyncio.get_running_loop().create_task(self._pump(factory(self.usage)))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for delta in source:
+                self.deltas.append(delta)
+                self._notify()
+        except BaseException as exc:  # noqa: BLE001
+            self.error = exc
+            if not isinstance(exc, Exception):
+                raise
+        finally:
+            self.done = True
+            self._on_done(self)
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.deltas):
+                    yield self.deltas[index]
+                    index += 1
+                if self.done:
+                    if isinstance(self.error, Exception):
+                        raise self.error
+                    if self.error is not None:
+                        raise RuntimeError("shared generation was cancelled")
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Registry of in-flight generations keyed by prompt and sampling params."""
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, SharedStream] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    @staticmethod
+    def make_key(prompt: Any, params: dict[str, Any]) -> str:
+        material = json.dumps({"prompt": prompt, "params": params}, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def stream(
+        self,
+        key: str,
+        factory: Callable[[dict[str, int]], AsyncIterator[str]],
+    ) -> tuple[AsyncIterator[str], dict[str, int], bool]:
+        """Subscribe to the generation for `key`, starting it if needed.
+
+        Returns the subscriber stream, the shared usage dict and whether an
+        existing generation was joined.
+        """
+        shared = self._inflight.get(key)
+        joined = shared is not None and not shared.done
+        if not joined:
+            shared = SharedStream(factory, lambda done: self._release(key, done))
+            self._inflight[key] = shared
+        return shared.subscribe(), shared.usage, joined
+
+    def _release(self, key: str, shared: SharedStream) -> None:
+        if self._inflight.get(key) is shared:
+            del self._inflight[key]
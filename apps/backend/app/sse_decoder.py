@@ -0,0 +1,41 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    _loads = json.loads
+
+DONE = b"[DONE]"
+
+
+class SseDecoder:
+    """Incremental decoder that yields raw `data:` payloads from SSE bytes.
+
+    Works directly on `aiter_bytes` chunks: no text decoding, no per-line
+    string allocation for fields other than `data`.
+    """
+
+    def __init__(self) -> None:
+        self._remainder = b""
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        if self._remainder:
+            chunk = self._remainder + chunk
+        lines = chunk.split(b"\n")
+        self._remainder = lines.pop()
+        return [line[5:].strip() for line in lines if line.startswith(b"data:")]
+
+
+def parse_chunk(payload: bytes) -> dict[str, Any]:
+    return _loads(payload)
+
+
+def delta_content(chunk: dict[str, Any]) -> str:
+    try:
+        return chunk["choices"][0]["delta"].get("content") or ""
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return ""
+
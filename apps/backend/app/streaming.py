@@ -0,0 +1,139 @@
+import asyncio
+import contextlib
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+_REPLAY_PIECES = re.compile(r"\s*\S+|\s+$")
+
+
+async def replay_text(text: str) -> AsyncIterator[str]:
+    """Replay a stored answer as a synthetic, word-by-word delta stream."""
+    for piece in _REPLAY_PIECES.findall(text):
+        yield piece
+
+
+async def coalesce_deltas(
+    source: AsyncIterator[str],
+    max_wait_seconds: float,
+    max_tokens: int,
+) -> AsyncIterator[list[str]]:
+    """Group upstream deltas into batches for fewer outbound SSE frames.
+
+    The first delta is always yielded on its own so TTFT is unaffected. After
+    that a batch is flushed once it holds `max_tokens` deltas or its oldest
+    delta has waited `max_wait_seconds`, whichever comes first — even if the
+    upstream stalls. Coalescing is disabled when either limit is <= 0/1.
+    """
+    if max_wait_seconds <= 0 or max_tokens <= 1:
+        async for delta in source:
+            yield [delta]
+        return
+
+    # One reader task drains the upstream into a queue, so each delta costs a
+    # queue put and get rather than a task and a wait.
+    queue: asyncio.Queue = asyncio.Queue()
+    reader = asyncio.ensure_future(_read_into(source, queue))
+    loop = asyncio.get_running_loop()
+    buffer: list[str] = []
+    deadline: float | None = None
+    try:
+        item = await queue.get()
+        if item is _END:
+            return
+        yield [_unwrap(item)]
+        while True:
+            if deadline is not None and loop.time() >= deadline:
+                yield buffer
+                buffer = []
+                deadline = None
+            if deadline is None:
+                item = await queue.get()
+            elif not queue.empty():
+                item = queue.get_nowait()
+            else:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await queue.get()
+                except TimeoutError:
+                    yield buffer
+                    buffer = []
+                    deadline = None
+                    continue
+            if item is _END:
+                break
+            buffer.append(_unwrap(item))
+            if deadline is None:
+                deadline = loop.time() + max_wait_seconds
+            if len(buffer) >= max_tokens:
+                yield buffer
+                buffer = []
+                deadline = None
+        if buffer:
+            yield buffer
+    finally:
+        reader.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reader
+
+
+_END = object()
+
+
+class _UpstreamError:
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+def _unwrap(item: Any) -> str:
+    if isinstance(item, _UpstreamError):
+        raise item.exc
+    return item
+
+
+async def _read_into(source: AsyncIterator[str], queue: asyncio.Queue) -> None:
+    try:
+        async for delta in source:
+            queue.put_nowait(delta)
+    except Exception as exc:  # noqa: BLE001
+        # Re-raised by the consumer where the delta would have been.
+        queue.put_nowait(_UpstreamError(exc))
+    finally:
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    queue.put_nowait(_END)
+
+
+class DisconnectWatcher:
+    """Cancels the consuming task once its client disconnects.
+
+    One background task per stream polls `is_disconnected` every
+    `poll_seconds`, including while the upstream is silent (queued or
+    prefilling), so the token loop iterates the upstream directly. The
+    cancellation unwinds the pending upstream read, which tears down the HTTP
+    stream so vLLM aborts the sequence; `disconnected` tells it apart from a
+    cancellation by Serve.
+    """
+
+    def __init__(self, is_disconnected: Callable[[], Awaitable[bool]], poll_seconds: float) -> None:
+        self.is_disconnected = is_disconnected
+        self.poll_seconds = poll_seconds
+        self.disconnected = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Watch on behalf of the current task."""
+        self._task = asyncio.ensure_future(self._watch(asyncio.current_task()))
+
+    async def _watch(self, consumer: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if await self.is_disconnected():
+                self.disconnected = True
+                consumer.cancel()
+                return
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,8 +1,16 @@
-import json
-from typing import AsyncIterator
+import importlib.util
+import logging
+from typing import Any, AsyncIterator
 
 import httpx
 
+from app.sse_decoder import DONE, SseDecoder, delta_content, parse_chunk
+
+logger = logging.getLogger("rag-app")
+
+# A prompt is either a single user message or a full chat message list.
+Prompt = str | list[dict[str, str]]
+
 
 class VllmStreamingGenerator:
     def __init__(
@@ -13,6 +21,10 @@ class VllmStreamingGenerator:
         temperature: float,
         top_p: float,
         timeout_seconds: int,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.model = model
@@ -20,64 +32,136 @@ class VllmStreamingGenerator:
         self.temperature = temperature
         self.top_p = top_p
         self.timeout = httpx.Timeout(timeout_seconds)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # HTTP/2 needs the optional `h2` package (httpx[http2]); fall back to
+        # HTTP/1.1 keep-alive rather than failing replica startup.
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning(
+                "vllm_http2_unavailable",
+                extra={"reason": "h2 package not installed"},
+            )
+            http2 = False
+        self.http2 = http2
+        self._client: httpx.AsyncClient | None = None
+        self.in_flight = 0
 
-    async def stream_chat(
-        self, prompt: str, max_tokens: int | None = None
-    ) -> AsyncIterator[str]:
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the replica's running event loop.
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                headers={"Content-Type": "application/json"},
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def pool_stats(self) -> dict[str, int]:
+        stats = {
+            "in_flight": self.in_flight,
+            "max_connections": self.limits.max_connections or 0,
+            "active_connections": 0,
+            "idle_connections": 0,
+        }
+        if self._client is None or self._client.is_closed:
+            return stats
+        # httpcore exposes the live connection list on the transport's pool.
+        pool = getattr(self._client._transport, "_pool", None)
+        for connection in getattr(pool, "connections", []):
+            if connection.is_idle():
+                stats["idle_connections"] += 1
+            else:
+                stats["active_connections"] += 1
+        return stats
+
+    def _payload(self, prompt: Prompt, max_tokens: int | None, stream: bool) -> dict[str, Any]:
+        messages = (
+            [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+        )
         payload = {
             "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
+            "messages": messages,
             "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
             "temperature": self.temperature,
             "top_p": self.top_p,
-            "stream": True,
+            "stream": stream,
         }
+        if stream:
+            # vLLM then sends a final chunk with real prompt/completion token counts.
+            payload["stream_options"] = {"include_usage": True}
+        return payload
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            async with client.stream(
+    async def stream_chat(
+        self,
+        prompt: Prompt,
+        max_tokens: int | None = None,
+        usage: dict[str, int] | None = None,
+    ) -> AsyncIterator[str]:
+        """Yield content deltas; vLLM's token usage is copied into `usage` if given."""
+        payload = self._payload(prompt, max_tokens, stream=True)
+
+        self.in_flight += 1
+        try:
+            async with self.client.stream(
                 "POST",
-                f"{self.base_url}/v1/chat/completions",
+                "/v1/chat/completions",
                 json=payload,
-                headers={"Content-Type": "application/json"},
             ) as response:
                 response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if not line or not line.startswith("data:"):
-                        continue
-                    data = line.replace("data:", "", 1).strip()
-                    if data == "[DONE]":
-                        break
-                    chunk = json.loads(data)
-                    delta = (
-                        chunk.get("choices", [{}])[0]
-                        .get("delta", {})
-                        .get("content", "")
-                    )
-                    if delta:
-                        yield delta
+                decoder = SseDecoder()
+                async for raw in response.aiter_bytes():
+                    for data in decoder.feed(raw):
+                        if data == DONE:
+                            return
+                        chunk = parse_chunk(data)
+                        delta = delta_content(chunk)
+                        if usage is not None and chunk.get("usage"):
+                            usage.update(chunk["usage"])
+                        if delta:
+                            yield delta
+        finally:
+            self.in_flight -= 1
 
     async def complete_chat(
-        self, prompt: str, max_tokens: int | None = None
+        self,
+        prompt: Prompt,
+        max_tokens: int | None = None,
+        usage: dict[str, int] | None = None,
     ) -> str:
-        payload = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
-            "temperature": self.temperature,
-            "top_p": self.top_p,
-            "stream": False,
-        }
+        payload = self._payload(prompt, max_tokens, stream=False)
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                f"{self.base_url}/v1/chat/completions",
-                json=payload,
-                headers={"Content-Type": "application/json"},
-            )
+        self.in_flight += 1
+        try:
+            response = await self.client.post("/v1/chat/completions", json=payload)
             response.raise_for_status()
             payload = response.json()
+            if usage is not None and payload.get("usage"):
+                usage.update(payload["usage"])
             return (
                 payload.get("choices", [{}])[0]
                 .get("message", {})
                 .get("content", "")
             )
+        finally:
+            self.in_flight -= 1
+
+    async def warm_prefix(self, messages: list[dict[str, str]]) -> int | None:
+        """Run a 1-token request so vLLM caches the KV blocks of `messages`.
+
+        Returns the prompt token count reported by vLLM, if any.
+        """
+        payload = self._payload(messages, 1, stream=False)
+        response = await self.client.post("/v1/chat/completions", json=payload)
+        response.raise_for_status()
+        return response.json().get("usage", {}).get("prompt_tokens")
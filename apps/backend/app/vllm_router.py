@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.config import env_flag
+from app.vllm_client import Prompt, VllmStreamingGenerator
+
+logger = logging.getLogger("rag-app")
+
+# Metric names per load field, preferred first. vLLM renamed the KV cache
+# gauge in v1 and some builds export both, so the old name is only a fallback.
+_LOAD_METRICS = {
+    "waiting": ("vllm:num_requests_waiting",),
+    "running": ("vllm:num_requests_running",),
+    "kv_cache_usage": ("vllm:kv_cache_usage_perc", "vllm:gpu_cache_usage_perc"),
+}
+
+
+def parse_load_metrics(text: str) -> dict[str, float]:
+    """vLLM's scheduler gauges from /metrics text.
+
+    Each field takes the max across label sets (one per engine), so a
+    multi-engine server reports its busiest engine and a cache fraction never
+    exceeds 1.0.
+    """
+    samples: dict[str, float] = {}
+    for family in text_string_to_metric_families(text):
+        values = [sample.value for sample in family.samples]
+        if values:
+            samples[family.name] = max(values)
+    load: dict[str, float] = {}
+    for field, names in _LOAD_METRICS.items():
+        for name in names:
+            if name in samples:
+                load[field] = samples[name]
+                break
+    return load
+
+
+class VllmEndpoint:
+    def __init__(self, generator: VllmStreamingGenerator) -> None:
+        self.generator = generator
+        self.url = generator.base_url
+        self.in_flight = 0
+        self.ttft_ewma: float | None = None
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.waiting = 0.0
+        self.running = 0.0
+        self.kv_cache_usage = 0.0
+        self.load_updated_at: float | None = None
+
+    def record_ttft(self, value: float, alpha: float) -> None:
+        if self.ttft_ewma is None:
+            self.ttft_ewma = value
+        else:
+            self.ttft_ewma = alpha * value + (1 - alpha) * self.ttft_ewma
+
+    def saturation(self, queue_depth_limit: float) -> float:
+        """KV cache fill or upstream queue depth, whichever is worse (1.0 = full)."""
+        queue_pressure = self.waiting / queue_depth_limit if queue_depth_limit > 0 else 0.0
+        return max(self.kv_cache_usage, queue_pressure)
+
+
+class VllmRouter:
+    """Least-outstanding-requests router over one or more vLLM endpoints.
+
+    Exposes the same stream_chat/complete_chat interface as
+    VllmStreamingGenerator so RagApp does not care how many pods exist.
+    """
+
+    def __init__(
+        self,
+        generators: list[VllmStreamingGenerator],
+        probe_interval_seconds: float = 5.0,
+        probe_timeout_seconds: float = 2.0,
+        failure_threshold: int = 3,
+        ttft_alpha: float = 0.2,
+        metrics_interval_seconds: float = 2.0,
+        saturation_queue_depth: float = 8.0,
+    ) -> None:
+        if not generators:
+            raise ValueError("VllmRouter requires at least one endpoint.")
+        self.endpoints = [VllmEndpoint(generator) for generator in generators]
+        self.probe_interval = probe_interval_seconds
+        self.probe_timeout = probe_timeout_seconds
+        self.failure_threshold = failure_threshold
+        self.ttft_alpha = ttft_alpha
+        self.metrics_interval = metrics_interval_seconds
+        self.saturation_queue_depth = saturation_queue_depth
+        self._probe_task: asyncio.Task | None = None
+        self._metrics_task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls) -> "VllmRouter":
+        base_url = os.getenv("VLLM_BASE_URL", "http://vllm:8000")
+        base_urls = [
+            url.strip()
+            for url in os.getenv("VLLM_BASE_URLS", base_url).split(",")
+            if url.strip()
+        ]
+        generators = [
+            VllmStreamingGenerator(
+                base_url=url,
+                model=os.getenv("VLLM_MODEL", "Qwen/Qwen2.5-7B-Instruct"),
+                max_tokens=int(os.getenv("VLLM_MAX_TOKENS", "512")),
+                temperature=float(os.getenv("VLLM_TEMPERATURE", "0.2")),
+                top_p=float(os.getenv("VLLM_TOP_P", "0.95")),
+                timeout_seconds=int(os.getenv("VLLM_TIMEOUT_SECONDS", "30")),
+                max_connections=int(os.getenv("VLLM_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("VLLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                keepalive_expiry=float(os.getenv("VLLM_KEEPALIVE_EXPIRY_SECONDS", "30")),
+                http2=env_flag("VLLM_HTTP2"),
+            )
+            for url in base_urls
+        ]
+        return cls(
+            generators,
+            probe_interval_seconds=float(os.getenv("VLLM_PROBE_INTERVAL_SECONDS", "5")),
+            failure_threshold=int(os.getenv("VLLM_EJECT_AFTER_FAILURES", "3")),
+            metrics_interval_seconds=float(os.getenv("VLLM_METRICS_INTERVAL_SECONDS", "2")),
+            saturation_queue_depth=float(os.getenv("VLLM_SATURATION_QUEUE_DEPTH", "8")),
+        )
+
+    @property
+    def max_tokens(self) -> int:
+        return self.endpoints[0].generator.max_tokens
+
+    def _ensure_probing(self) -> None:
+        # Started on first use because replica __init__ may run outside the loop.
+        loop = asyncio.get_running_loop()
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = loop.create_task(self._probe_loop())
+        if self.metrics_interval > 0 and (
+            self._metrics_task is None or self._metrics_task.done()
+        ):
+            self._metrics_task = loop.create_task(self._metrics_loop())
+
+    def start(self) -> None:
+        """Start health probing and load polling from a running event loop."""
+        self._ensure_probing()
+
+    def saturation(self) -> float | None:
+        """Saturation of the least-loaded healthy endpoint, or None when unknown.
+
+        Load samples older than three poll intervals are ignored so a stalled
+        scrape fails open rather than shedding on stale data.
+        """
+        if self.metrics_interval <= 0:
+            return None
+        cutoff = time.monotonic() - 3 * self.metrics_interval
+        scores = [
+            endpoint.saturation(self.saturation_queue_depth)
+            for endpoint in self.endpoints
+            if endpoint.healthy
+            and endpoint.load_updated_at is not None
+            and endpoint.load_updated_at >= cutoff
+        ]
+        return min(scores) if scores else None
+
+    def _pick(self) -> VllmEndpoint:
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+        if not candidates:
+            # Fail open: a stale health view is better than refusing every request.
+            candidates = self.endpoints
+        return min(
+            candidates,
+            key=lambda endpoint: (endpoint.in_flight, endpoint.ttft_ewma or 0.0),
+        )
+
+    def _record_failure(self, endpoint: VllmEndpoint, exc: Exception) -> None:
+        endpoint.consecutive_failures += 1
+        if endpoint.healthy and endpoint.consecutive_failures >= self.failure_threshold:
+            endpoint.healthy = False
+            logger.warning(
+                "vllm_endpoint_ejected",
+                extra={"endpoint": endpoint.url, "error": str(exc)},
+            )
+
+    def _record_success(self, endpoint: VllmEndpoint) -> None:
+        endpoint.consecutive_failures = 0
+        if not endpoint.healthy:
+            endpoint.healthy = True
+            logger.info("vllm_endpoint_readmitted", extra={"endpoint": endpoint.url})
+
+    @staticmethod
+    def _is_endpoint_failure(exc: Exception) -> bool:
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code >= 500
+        return isinstance(exc, httpx.TransportError)
+
+    async def stream_chat(
+        self,
+        prompt: Prompt,
+        max_tokens: int | None = None,
+        usage: dict[str, int] | None = None,
+    ) -> AsyncIterator[str]:
+        self._ensure_probing()
+        endpoint = self._pick()
+        endpoint.in_flight += 1
+        start = time.perf_counter()
+        first_token = True
+        try:
+            async for delta in endpoint.generator.stream_chat(prompt, max_tokens, usage):
+                if first_token:
+                    first_token = False
+                    endpoint.record_ttft(time.perf_counter() - start, self.ttft_alpha)
+                yield delta
+            self._record_success(endpoint)
+        except Exception as exc:
+            if self._is_endpoint_failure(exc):
+                self._record_failure(endpoint, exc)
+            raise
+        finally:
+            endpoint.in_flight -= 1
+
+    async def complete_chat(
+        self,
+        prompt: Prompt,
+        max_tokens: int | None = None,
+        usage: dict[str, int] | None = None,
+    ) -> str:
+        self._ensure_probing()
+        endpoint = self._pick()
+        endpoint.in_flight += 1
+        try:
+            answer = await endpoint.generator.complete_chat(prompt, max_tokens, usage)
+            self._record_success(endpoint)
+            return answer
+        except Exception as exc:
+            if self._is_endpoint_failure(exc):
+                self._record_failure(endpoint, exc)
+            raise
+        finally:
+            endpoint.in_flight -= 1
+
+    async def warm_prefix(self, messages: list[dict[str, str]]) -> int | None:
+        # Every pod keeps its own KV cache, so warm all of them.
+        results = await asyncio.gather(
+            *(endpoint.generator.warm_prefix(messages) for endpoint in self.endpoints),
+            return_exceptions=True,
+        )
+        for endpoint, result in zip(self.endpoints, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    "vllm_prefix_warmup_failed",
+                    extra={"endpoint": endpoint.url, "error": str(result)},
+                )
+        counts = [result for result in results if isinstance(result, int)]
+        return counts[0] if counts else None
+
+    async def _probe(self, endpoint: VllmEndpoint) -> None:
+        try:
+            response = await endpoint.generator.client.get(
+                "/health", timeout=self.probe_timeout
+            )
+            response.raise_for_status()
+        except Exception as exc:  # noqa: BLE001
+            self._record_failure(endpoint, exc)
+            return
+        self._record_success(endpoint)
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._probe(endpoint) for endpoint in self.endpoints))
+            await asyncio.sleep(self.probe_interval)
+
+    async def _scrape_load(self, endpoint: VllmEndpoint) -> None:
+        try:
+            response = await endpoint.generator.client.get(
+                "/metrics", timeout=self.probe_timeout
+            )
+            response.raise_for_status()
+            load = parse_load_metrics(response.text)
+        except Exception as exc:  # noqa: BLE001
+            logger.debug(
+                "vllm_metrics_scrape_failed",
+                extra={"endpoint": endpoint.url, "error": str(exc)},
+            )
+            return
+        endpoint.waiting = load.get("waiting", 0.0)
+        endpoint.running = load.get("running", 0.0)
+        endpoint.kv_cache_usage = load.get("kv_cache_usage", 0.0)
+        endpoint.load_updated_at = time.monotonic()
+
+    async def _metrics_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._scrape_load(endpoint) for endpoint in self.endpoints))
+            await asyncio.sleep(self.metrics_interval)
+
+    async def aclose(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+        for endpoint in self.endpoints:
+            await endpoint.generator.aclose()
+
+    def pool_stats(self) -> dict[str, int]:
+        totals = {
+            "in_flight": 0,
+            "max_connections": 0,
+            "active_connections": 0,
+            "idle_connections": 0,
+        }
+        for endpoint in self.endpoints:
+            for key, value in endpoint.generator.pool_stats().items():
+                totals[key] += value
+        return totals
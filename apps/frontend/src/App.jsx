@@ -2,6 +2,9 @@ import { useEffect, useMemo, useState } from "react";
 
 const defaultBackend = import.meta.env.VITE_BACKEND_URL || `${window.location.origin}/api`;
 const ROLLING_WINDOW = 50;
+// Job status lives on the backend replica that accepted the job, so polls
+// routed to another replica answer 404; keep polling for this many.
+const MAX_JOB_STATUS_MISSES = 300;
 
 const percentile = (values, pct) => {
   if (!values.length) {
@@ -383,8 +386,43 @@ export default function App() {
         method: "POST",
         body: formData,
       });
-      const data = await response.json();
-      setStatus(`Ingested ${data.ingested || 0} files.`);
+      if (!response.ok) {
+        const errorText = await response.text();
+        throw new Error(errorText || "Ingest submit failed");
+      }
+      let job = await response.json();
+      let misses = 0;
+      while (
+        (job.status === "queued" || job.status === "running") &&
+        misses < MAX_JOB_STATUS_MISSES
+      ) {
+        setStatus(
+          `Ingesting (${job.status}): ${job.progress.docs_fetched} docs fetched, ` +
+            `${job.progress.chunks_written} chunks written...`
+        );
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const jobResponse = await fetch(`${backendUrl}/ingest/jobs/${job.job_id}`);
+        if (jobResponse.status === 404) {
+          misses += 1;
+          continue;
+        }
+        if (!jobResponse.ok) {
+          const errorText = await jobResponse.text();
+          throw new Error(errorText || "Ingest status failed");
+        }
+        misses = 0;
+        job = await jobResponse.json();
+      }
+      if (job.status === "queued" || job.status === "running") {
+        setStatus(
+          "Ingest accepted; its status is held by another backend replica. " +
+            "Check the document list later."
+        );
+      } else if (job.status !== "succeeded") {
+        throw new Error(job.errors[job.errors.length - 1] || job.status);
+      } else {
+        setStatus(`Ingested ${job.result?.ingested || 0} files.`);
+      }
       try {
         const docsResponse = await fetch(`${backendUrl}/documents`);
         const docsData = await docsResponse.json();
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Offline crawl throughput benchmark for sitemap ingestion.
+
+Serves a synthetic nested sitemap (a sitemap index pointing at page
+sitemaps) from a local threaded HTTP server with configurable per-page
+latency and transient 503 rate. It then compares the previous sequential
+`requests.get` loop with the backend's async Crawler.
+
+Usage:
+  python scripts/benchmark/crawl_bench.py --pages 2000 --latency-ms 50 --concurrency 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "apps" / "backend"))
+
+from app.crawler import Crawler  # noqa: E402
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def make_handler(pages: int, per_sitemap: int, latency: float, error_rate: float, seed: int):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802
+            base = f"http://{self.headers['Host']}"
+            if self.path == "/sitemap.xml":
+                entries = "".join(
+                    f"<sitemap><loc>{base}/sitemap-{index}.xml</loc></sitemap>"
+                    for index in range((pages + per_sitemap - 1) // per_sitemap)
+                )
+                body = f'<?xml version="1.0"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'
+                return self._send(200, body.encode(), "application/xml")
+            if self.path.startswith("/sitemap-"):
+                index = int(self.path.removeprefix("/sitemap-").removesuffix(".xml"))
+                first = index * per_sitemap
+                entries = "".join(
+                    f"<url><loc>{base}/page/{page}</loc></url>"
+                    for page in range(first, min(pages, first + per_sitemap))
+                )
+                body = f'<?xml version="1.0"?><urlset xmlns="{SITEMAP_NS}">{entries}</urlset>'
+                return self._send(200, body.encode(), "application/xml")
+            if self.path.startswith("/page/"):
+                time.sleep(latency)
+                with lock:
+                    failed = rng.random() < error_rate
+                if failed:
+                    return self._send(503, b"busy", "text/plain")
+                page = self.path.removeprefix("/page/")
+                body = f"<html><body><h1>Page {page}</h1><p>{'lorem ipsum ' * 200}</p></body></html>"
+                return self._send(200, body.encode(), "text/html; charset=utf-8")
+            self._send(404, b"not found", "text/plain")
+
+    return Handler
+
+
+def sequential_crawl(sitemap_url: str, limit: int) -> dict[str, float]:
+    """The previous ingest loop: one blocking fetch after another."""
+    start = time.perf_counter()
+    fetched = errors = 0
+    index = BeautifulSoup(requests.get(sitemap_url, timeout=10).text, "xml")
+    for child in index.find_all("loc"):
+        soup = BeautifulSoup(requests.get(child.text.strip(), timeout=10).text, "xml")
+        for loc in soup.find_all("loc"):
+            if fetched + errors >= limit:
+                break
+            response = requests.get(loc.text.strip(), timeout=10)
+            if response.ok:
+                fetched += 1
+            else:
+                errors += 1
+        if fetched + errors >= limit:
+            break
+    seconds = time.perf_counter() - start
+    return {
+        "pages": fetched,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(fetched / seconds, 1),
+    }
+
+
+async def async_crawl(sitemap_url: str, args: argparse.Namespace) -> dict[str, float]:
+    crawler = Crawler(
+        max_concurrency=args.concurrency,
+        per_host=args.per_host,
+        retries=args.retries,
+        backoff_seconds=args.backoff,
+    )
+    start = time.perf_counter()
+    fetched = errors = 0
+    try:
+        async for page in crawler.crawl(crawler.iter_sitemap(sitemap_url)):
+            if page.error is None:
+                fetched += 1
+            else:
+                errors += 1
+    finally:
+        await crawler.aclose()
+    seconds = time.perf_counter() - start
+    return {
+        "pages": fetched,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(fetched / seconds, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sitemap crawl throughput")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages in the synthetic sitemap")
+    parser.add_argument("--per-sitemap", type=int, default=500, help="Pages per child sitemap")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Server latency per page")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of 503 responses")
+    parser.add_argument("--concurrency", type=int, default=32, help="Crawler global concurrency")
+    parser.add_argument("--per-host", type=int, default=32, help="Crawler per-host concurrency")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.05, help="Base retry backoff seconds")
+    parser.add_argument(
+        "--baseline-pages",
+        type=int,
+        default=200,
+        help="Pages fetched by the sequential baseline (0 skips it)",
+    )
+    args = parser.parse_args()
+
+    handler = make_handler(
+        args.pages, args.per_sitemap, args.latency_ms / 1000, args.error_rate, seed=7
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sitemap_url = f"http://127.0.0.1:{server.server_address[1]}/sitemap.xml"
+
+    results = {}
+    try:
+        if args.baseline_pages:
+            results["sequential_requests"] = sequential_crawl(sitemap_url, args.baseline_pages)
+        results["async_crawler"] = asyncio.run(async_crawl(sitemap_url, args))
+    finally:
+        server.shutdown()
+
+    baseline = results.get("sequential_requests", {}).get("pages_per_second")
+    if baseline:
+        results["async_crawler"]["speedup"] = round(
+            results["async_crawler"]["pages_per_second"] / baseline, 1
+        )
+    summary = {
+        "pages": args.pages,
+        "latency_ms": args.latency_ms,
+        "error_rate": args.error_rate,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
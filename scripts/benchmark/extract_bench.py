@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Offline text extraction benchmark for file uploads.
+
+Builds a synthetic corpus of multi-page PDFs, DOCX and HTML files, then
+extracts it serially in one process (the previous upload path) and with the
+backend's ExtractionPool at several worker counts. Every run's text is
+checked against the serial output, so the speedup is for identical results.
+
+Usage:
+  python scripts/benchmark/extract_bench.py --pdfs 8 --pages 60 --workers 1,2,4,8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from docx import Document as DocxDocument
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "apps" / "backend"))
+
+from app.config import available_cpus, cgroup_cpu_quota  # noqa: E402
+from app.extraction import ExtractionPool, SpooledUpload, iter_upload_text  # noqa: E402
+
+WORDS = (
+    "retrieval augmented generation ray serve haystack embedding vector store chunk "
+    "document replica latency throughput token prompt context answer query index"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_pdf(pages: int, lines_per_page: int, rng: random.Random) -> bytes:
+    """A minimal PDF with one Helvetica text line per content-stream row."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for _ in range(pages):
+        rows = "".join(
+            f"BT /F1 10 Tf 40 {780 - 18 * row} Td ({sentence(rng, 12)}) Tj ET\n"
+            for row in range(lines_per_page)
+        ).encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(rows), rows))
+        content = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids),
+        pages,
+    )
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    )
+    return out.getvalue()
+
+
+def make_docx(paragraphs: int, rng: random.Random) -> bytes:
+    document = DocxDocument()
+    for _ in range(paragraphs):
+        document.add_paragraph(sentence(rng, 40))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_html(sections: int, rng: random.Random) -> bytes:
+    body = "".join(
+        f"<section><h2>{sentence(rng, 4)}</h2><p>{sentence(rng, 60)}</p>"
+        f"<ul><li>{sentence(rng, 8)}</li><li>{sentence(rng, 8)}</li></ul></section>"
+        for _ in range(sections)
+    )
+    return f"<html><body>{body}</body></html>".encode()
+
+
+def build_corpus(args: argparse.Namespace, directory: Path) -> list[SpooledUpload]:
+    rng = random.Random(7)
+    files: list[tuple[str, bytes]] = []
+    for index in range(args.pdfs):
+        files.append((f"doc-{index}.pdf", make_pdf(args.pages, 40, rng)))
+    for index in range(args.docx):
+        files.append((f"doc-{index}.docx", make_docx(args.paragraphs, rng)))
+    for index in range(args.html):
+        files.append((f"page-{index}.html", make_html(args.sections, rng)))
+    rng.shuffle(files)
+    uploads = []
+    for name, data in files:
+        # Written to disk like a spooled upload past RAG_UPLOAD_SPOOL_MAX_BYTES.
+        path = directory / name
+        path.write_bytes(data)
+        uploads.append(SpooledUpload(name, path.open("rb"), path=str(path)))
+    return uploads
+
+
+def serial_extract(uploads: list[SpooledUpload]) -> tuple[list[str], float]:
+    """The previous upload path: one file after another in this process."""
+    start = time.perf_counter()
+    texts = ["".join(iter_upload_text(upload)) for upload in uploads]
+    return texts, time.perf_counter() - start
+
+
+async def pool_extract(pool: ExtractionPool, uploads: list[SpooledUpload]) -> list[str]:
+    texts = []
+    async for _upload, parts in pool.extract(uploads):
+        texts.append("".join([part async for part in parts]))
+    return texts
+
+
+async def run_pool(
+    workers: int, args: argparse.Namespace, uploads: list[SpooledUpload]
+) -> tuple[list[str], float]:
+    pool = ExtractionPool(workers=workers, pages_per_part=args.pages_per_part)
+    try:
+        # Warm up so process start-up is not timed.
+        await pool_extract(pool, uploads[: workers or 1])
+        start = time.perf_counter()
+        texts = await pool_extract(pool, uploads)
+        return texts, time.perf_counter() - start
+    finally:
+        pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Upload text extraction scaling")
+    parser.add_argument("--pdfs", type=int, default=8, help="Synthetic PDF files")
+    parser.add_argument("--pages", type=int, default=60, help="Pages per PDF")
+    parser.add_argument("--docx", type=int, default=8, help="Synthetic DOCX files")
+    parser.add_argument("--paragraphs", type=int, default=400, help="Paragraphs per DOCX")
+    parser.add_argument("--html", type=int, default=8, help="Synthetic HTML files")
+    parser.add_argument("--sections", type=int, default=400, help="Sections per HTML file")
+    parser.add_argument("--pages-per-part", type=int, default=8, help="PDF pages per pool task")
+    parser.add_argument(
+        "--workers",
+        default=None,
+        help="Comma-separated pool sizes (default: 1, 2, 4, ... up to the CPU quota)",
+    )
+    args = parser.parse_args()
+
+    cpus = available_cpus()
+    if args.workers:
+        worker_counts = [int(value) for value in args.workers.split(",")]
+    else:
+        worker_counts = sorted({min(2**power, cpus) for power in range(cpus.bit_length() + 1)})
+
+    with tempfile.TemporaryDirectory(prefix="extract-bench-") as directory:
+        uploads = build_corpus(args, Path(directory))
+        try:
+            expected, serial_seconds = serial_extract(uploads)
+            results = {
+                "serial": {
+                    "seconds": round(serial_seconds, 3),
+                    "files_per_second": round(len(uploads) / serial_seconds, 1),
+                }
+            }
+            for workers in worker_counts:
+                texts, seconds = asyncio.run(run_pool(workers, args, uploads))
+                results[f"pool_{workers}"] = {
+                    "seconds": round(seconds, 3),
+                    "files_per_second": round(len(uploads) / seconds, 1),
+                    "speedup": round(serial_seconds / seconds, 2),
+                    "identical": texts == expected,
+                }
+        finally:
+            for upload in uploads:
+                upload.close()
+
+    summary = {
+        "files": len(uploads),
+        "pdf_pages": args.pdfs * args.pages,
+        "available_cpus": cpus,
+        "cgroup_cpu_quota": cgroup_cpu_quota(),
+        "pages_per_part": args.pages_per_part,
+        "results": results,
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
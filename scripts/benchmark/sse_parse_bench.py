@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for vLLM SSE stream parsing in the backend.
+
+Compares the previous per-line parser (aiter_lines + str.replace + json.loads
++ .get chain) with the byte-level SseDecoder used by VllmStreamingGenerator.
+Runs offline against a synthetic vLLM chat-completions stream.
+
+Usage:
+  python scripts/benchmark/sse_parse_bench.py --tokens 20000 --chunk-bytes 512
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+from httpx._decoders import LineDecoder, TextDecoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "apps" / "backend"))
+
+from app import sse_decoder  # noqa: E402
+
+
+def synthetic_stream(tokens: int, chunk_bytes: int, seed: int = 7) -> list[bytes]:
+    rng = random.Random(seed)
+    words = ["the", " vector", " store", " returns", " relevant", " chunks", ",", " é", "\n"]
+    body = bytearray()
+    for _ in range(tokens):
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "Qwen/Qwen2.5-7B-Instruct",
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"content": rng.choice(words)},
+                    "logprobs": None,
+                    "finish_reason": None,
+                }
+            ],
+        }
+        # vLLM (pydantic) emits compact JSON without spaces.
+        body += b"data: " + json.dumps(chunk, separators=(",", ":")).encode() + b"\n\n"
+    body += b"data: [DONE]\n\n"
+    # Network reads do not respect event boundaries; split at fixed sizes.
+    return [bytes(body[i : i + chunk_bytes]) for i in range(0, len(body), chunk_bytes)]
+
+
+def legacy_parse(chunks: list[bytes]) -> int:
+    text_decoder = TextDecoder()
+    line_decoder = LineDecoder()
+    count = 0
+    for raw in chunks:
+        for line in line_decoder.decode(text_decoder.decode(raw)):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line.replace("data:", "", 1).strip()
+            if data == "[DONE]":
+                return count
+            chunk = json.loads(data)
+            delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
+            if delta:
+                count += 1
+    return count
+
+
+def decoder_full_parse(chunks: list[bytes]) -> int:
+    decoder = sse_decoder.SseDecoder()
+    count = 0
+    for raw in chunks:
+        for data in decoder.feed(raw):
+            if data == sse_decoder.DONE:
+                return count
+            if sse_decoder.delta_content(sse_decoder.parse_chunk(data)):
+                count += 1
+    return count
+
+
+def time_parser(parser: Callable[[list[bytes]], int], chunks: list[bytes], repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    tokens = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = parser(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best, tokens
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SSE parse cost per token")
+    parser.add_argument("--tokens", type=int, default=20000, help="Tokens per stream")
+    parser.add_argument("--chunk-bytes", type=int, default=512, help="Bytes per network read")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions (best is reported)")
+    args = parser.parse_args()
+
+    chunks = synthetic_stream(args.tokens, args.chunk_bytes)
+    parsers = {
+        "legacy_lines_json": legacy_parse,
+        "bytes_decoder_full_parse": decoder_full_parse,
+    }
+    results = {}
+    for name, fn in parsers.items():
+        seconds, tokens = time_parser(fn, chunks, args.repeat)
+        results[name] = {
+            "tokens": tokens,
+            "ns_per_token": round(seconds / max(tokens, 1) * 1e9, 1),
+        }
+    baseline = results["legacy_lines_json"]["ns_per_token"]
+    for stats in results.values():
+        stats["speedup"] = round(baseline / stats["ns_per_token"], 2) if stats["ns_per_token"] else None
+    summary = {
+        "tokens": args.tokens,
+        "chunk_bytes": args.chunk_bytes,
+        "orjson": sse_decoder._loads is not json.loads,
+        "results": results,
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
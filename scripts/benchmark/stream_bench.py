@@ -2,7 +2,8 @@
 """
 Lightweight streaming benchmark for /query/stream.
 
-Measures TTFT, TPOT, tokens/sec (approx), and total latency.
+Measures TTFT, TPOT, tokens/sec, and total latency. Token counts come from
+the backend's done event (vLLM usage) and fall back to whitespace estimates.
 Portable across Akamai LKE, AWS EKS, and GCP GKE.
 
 Phase 2 additions:
@@ -74,6 +75,7 @@ async def run_request(
     last_token_time: Optional[float] = None
     token_count = 0
     done_token_count: Optional[int] = None
+    done_prompt_tokens: Optional[int] = None
 
     try:
         async with client.stream("POST", url, json=request_payload) as response:
@@ -103,7 +105,11 @@ async def run_request(
                         last_token_time = current_time
                         token_count += max(1, len(payload.get("text", "").split()))
                     if event_name == "done":
-                        done_token_count = payload.get("token_count")
+                        # Backend reports vLLM usage; whitespace counts are a fallback.
+                        done_token_count = payload.get(
+                            "completion_tokens", payload.get("token_count")
+                        )
+                        done_prompt_tokens = payload.get("prompt_tokens")
                         break
                     event_name = None
                     event_data = None
@@ -127,6 +133,8 @@ async def run_request(
             "total": total,
             "tpot": tpot,
             "token_count": final_token_count,
+            "token_count_source": "server" if done_token_count is not None else "estimated",
+            "prompt_tokens": done_prompt_tokens,
             "tokens_per_second": tokens_per_second,
         }
     except Exception as exc:  # noqa: BLE001
@@ -190,6 +198,8 @@ def compute_phase_stats(results: list[dict[str, Any]]) -> dict[str, Any]:
     tokens_per_second = [r["tokens_per_second"] for r in success]
     tpot_values = [r["tpot"] for r in success if r.get("tpot") is not None]
     token_counts = [r["token_count"] for r in success if r.get("token_count")]
+    prompt_token_counts = [r["prompt_tokens"] for r in success if r.get("prompt_tokens")]
+    estimated = [r for r in success if r.get("token_count_source") == "estimated"]
 
     return {
         "requests": len(results),
@@ -208,6 +218,10 @@ def compute_phase_stats(results: list[dict[str, Any]]) -> dict[str, Any]:
         "avg_output_tokens": round(
             statistics.mean(token_counts) if token_counts else 0.0, 1
         ),
+        "avg_prompt_tokens": round(
+            statistics.mean(prompt_token_counts) if prompt_token_counts else 0.0, 1
+        ),
+        "estimated_token_counts": len(estimated),
     }
 
 
@@ -293,6 +307,7 @@ async def run_benchmark(args: argparse.Namespace) -> dict[str, Any]:
         "avg_tokens_per_sec": measured_stats["avg_tokens_per_sec"],
         "total_tokens": measured_stats["total_tokens"],
         "avg_output_tokens": measured_stats["avg_output_tokens"],
+        "avg_prompt_tokens": measured_stats["avg_prompt_tokens"],
         # Phase details
         "phases": {
             "warmup": warmup_stats,